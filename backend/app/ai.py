@@ -6,6 +6,10 @@ import requests
 import asyncio
 from pathlib import Path
 
+from .ai_cache import AnalysisCache, anomaly_signature
+from .ai_scheduler import AIScheduler, CHAT, CRITICAL, AUTONOMY, WARNING
+from .prompt_context import chat_context, compact_json
+
 # Try importing Google Generative AI
 try:
     import google.generativeai as genai
@@ -15,8 +19,16 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+def _is_usable_analysis(content: str) -> bool:
+    # Don't cache fallbacks ("{}" from a failed call, root_cause "Error") or unparseable answers
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        return False
+    return isinstance(data, dict) and bool(data.get("suggested_action")) and data.get("root_cause") != "Error"
+
 class AICollaborator:
-    def __init__(self):
+    def __init__(self, scheduler: AIScheduler = None):
         self.google_api_key = os.getenv("GOOGLE_API_KEY")
         
         if self.google_api_key and HAS_GOOGLE_AI:
@@ -30,12 +42,19 @@ class AICollaborator:
             self.model_name = "llama3.2" 
             self.use_google = False
 
+        # Every model call waits for a slot here: bounded concurrency, chat first (see ai_scheduler.py)
+        self.scheduler = scheduler or AIScheduler()
+        # Recurring anomalies (same machine type / metric / severity / value range) reuse one analysis
+        self.analysis_cache = AnalysisCache()
+        self._rules = ""
+        self._rules_mtime = None
+
     async def _call_gemini(self, prompt: str) -> str:
         try:
             model = genai.GenerativeModel('gemini-2.0-flash-lite-001')
             # Gemini runs synchronously in its basic form, so we wrap it
             loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(None, lambda: model.generate_content(prompt))
+            response = await loop.run_in_executor(self.scheduler.executor, lambda: model.generate_content(prompt))
             return response.text
         except Exception as e:
             logger.error(f"Gemini Error: {e}")
@@ -49,7 +68,7 @@ class AICollaborator:
             "format": "json"
         }
         loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(None, lambda: requests.post(
+        response = await loop.run_in_executor(self.scheduler.executor, lambda: requests.post(
             self.api_url,
             json=payload,
             timeout=10
@@ -60,7 +79,12 @@ class AICollaborator:
         else:
              raise Exception(f"Ollama Status {response.status_code}")
 
-    async def _generate_response(self, prompt: str) -> str:
+    async def _generate_response(self, prompt: str, priority: int = WARNING) -> str:
+        # AIRequestDropped (no slot before the deadline) propagates: callers already handle errors
+        async with self.scheduler.slot(priority):
+            return await self._call_model(prompt)
+
+    async def _call_model(self, prompt: str) -> str:
         if self.use_google:
             try:
                 # Add explicit JSON instruction for Gemini if not present in prompt (it usually is)
@@ -79,22 +103,30 @@ class AICollaborator:
                 logger.error(f"Ollama failed: {e}")
                 return "{}"
 
-    async def chat(self, message: str, context: Dict[str, Any] = None) -> str:
-        # Load external rulebook
-        rules = ""
+    def _load_rules(self) -> str:
+        # External rulebook, re-read only when the file changes
         try:
             rule_path = Path(__file__).parent / "rules.txt"
-            if rule_path.exists():
-                 with open(rule_path, "r", encoding="utf-8") as f:
-                     rules = f.read()
-        except:
-             pass
+            mtime = rule_path.stat().st_mtime
+            if mtime != self._rules_mtime:
+                with open(rule_path, "r", encoding="utf-8") as f:
+                    self._rules = f.read()
+                self._rules_mtime = mtime
+        except OSError:
+            pass
+        return self._rules
+
+    async def chat(self, message: str, context: Dict[str, Any] = None) -> str:
+        rules = self._load_rules()
+        if context and "lines" in context:
+            # Full factory state: abnormal machines in full, the rest summarised per line
+            context = chat_context(context, message)
 
         prompt_text = f"""
         {rules}
         
         CURRENT CONTEXT:
-        {json.dumps(context, indent=2) if context else "No context loaded."}
+        {compact_json(context) if context else "No context loaded."}
         
         USER INPUT: {message}
         
@@ -113,7 +145,7 @@ class AICollaborator:
         """
         
         try:
-            content = await self._generate_response(prompt_text)
+            content = await self._generate_response(prompt_text, CHAT)
             
             # Clean Markdown
             content = content.replace("```json", "").replace("```", "").strip()
@@ -145,10 +177,19 @@ class AICollaborator:
             logger.error(f"Chat Error: {e}")
             return "系統忙碌中 (AI Error)"
 
-    async def analyze_anomaly(self, anomaly: Dict[str, Any]) -> str:
+    async def analyze_anomaly(self, anomaly: Dict[str, Any], machine_type: str = None) -> str:
+        """JSON analysis string for an anomaly, shared across anomalies with the same signature."""
+        return await self.analysis_cache.get_or_compute(
+            anomaly_signature(anomaly, machine_type),
+            lambda: self._analyze_anomaly(anomaly),
+            cacheable=_is_usable_analysis,
+        )
+
+    async def _analyze_anomaly(self, anomaly: Dict[str, Any]) -> str:
+        priority = CRITICAL if anomaly.get("severity") in ("critical", "high") else WARNING
         prompt_text = f"""
         Analyze this factory anomaly and suggest actions.
-        Anomaly: {json.dumps(anomaly, indent=2)}
+        Anomaly: {compact_json(anomaly)}
         
         Provide a concise response in valid JSON format with the following keys:
         - root_cause: A short explanation of the cause.
@@ -159,7 +200,7 @@ class AICollaborator:
         """
         
         try:
-            content = await self._generate_response(prompt_text)
+            content = await self._generate_response(prompt_text, priority)
             content = content.replace("```json", "").replace("```", "").strip()
             return content
         except Exception as e:
@@ -169,7 +210,7 @@ class AICollaborator:
     async def evaluate_autonomy(self, context: Dict[str, Any]) -> Dict[str, Any]:
         prompt_text = f"""
         CURRENT CONTEXT:
-        {json.dumps(context, indent=2)}
+        {compact_json(context)}
         
         TASK:
         You are an Intelligent Factory Manager. Optimize the factory.
@@ -194,7 +235,7 @@ class AICollaborator:
         """
         
         try:
-            content = await self._generate_response(prompt_text)
+            content = await self._generate_response(prompt_text, AUTONOMY)
             content = content.replace("```json", "").replace("```", "").strip()
             return json.loads(content)
         except Exception as e:
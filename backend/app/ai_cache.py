@@ -0,0 +1,114 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+# Relative width of a value bucket: 0.05 -> values within ~5% of each other share an analysis
+VALUE_STEP = float(os.getenv("AI_CACHE_VALUE_STEP", 0.05))
+
+
+def value_bucket(value: Optional[float]) -> Optional[int]:
+    """Log-scale bucket index, so the bucket width grows with the value (104.3 and 105.0 match, 104 and 120 don't)."""
+    if value is None:
+        return None
+    if value <= 0:
+        return 0
+    return int(math.floor(math.log(value) / math.log1p(VALUE_STEP)))
+
+
+def anomaly_signature(anomaly: Dict[str, Any], machine_type: Optional[str] = None) -> Tuple:
+    """What makes two anomalies "the same question" for the AI: machine type, metric, kind, severity, value bucket."""
+    return (
+        machine_type,
+        anomaly.get("metric") or (anomaly.get("message") or "").split(" ")[0].lower(),
+        anomaly.get("type"),
+        anomaly.get("severity"),
+        value_bucket(anomaly.get("value")),
+    )
+
+
+class AnalysisCache:
+    """LRU + TTL cache for LLM answers, with single-flight de-duplication.
+
+    A miss starts one task per key; callers that ask for the same key while it
+    is running await that task instead of starting their own LLM call. Only
+    answers that pass `cacheable` are stored, so a failed or empty response is
+    retried next time. Counters feed stats() (hit rate counts coalesced
+    callers as hits: they didn't cost a call either).
+    """
+
+    def __init__(self, max_entries: int = None, ttl: float = None):
+        self.max_entries = max_entries or int(os.getenv("AI_CACHE_SIZE", 256))
+        self.ttl = ttl if ttl is not None else float(os.getenv("AI_CACHE_TTL", 900))
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict() # key -> (value, expires_at)
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def _lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expired += 1
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def _store(self, key: Hashable, value: Any):
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]],
+                             cacheable: Callable[[Any], bool] = lambda value: True) -> Any:
+        found, value = self._lookup(key)
+        if found:
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+
+            def finished(done: asyncio.Future):
+                self._inflight.pop(key, None)
+                if done.cancelled() or done.exception() is not None:
+                    self.errors += 1
+                elif cacheable(done.result()):
+                    self._store(key, done.result())
+            task.add_done_callback(finished)
+
+        # Shielded: one caller being cancelled must not cancel the call the others are waiting on
+        return await asyncio.shield(task)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.coalesced + self.misses
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "errors": self.errors,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else None,
+        }
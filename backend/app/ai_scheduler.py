@@ -0,0 +1,124 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, most urgent first (lower number = served first)
+CHAT = 0 # Interactive /api/v1/chat: a person is waiting
+CRITICAL = 1 # Analysis of a critical alert
+AUTONOMY = 2 # Periodic optimisation cycle
+WARNING = 3 # Analysis of a warning alert
+CLASS_NAMES = {CHAT: "chat", CRITICAL: "critical", AUTONOMY: "autonomy", WARNING: "warning"}
+
+# How long a request may wait for a slot before it is dropped (seconds).
+# Autonomy runs every 10 s, so an older cycle is worthless once the next one is queued.
+DEFAULT_DEADLINES = {
+    CHAT: float(os.getenv("AI_DEADLINE_CHAT", 60)),
+    CRITICAL: float(os.getenv("AI_DEADLINE_CRITICAL", 30)),
+    AUTONOMY: float(os.getenv("AI_DEADLINE_AUTONOMY", 10)),
+    WARNING: float(os.getenv("AI_DEADLINE_WARNING", 60)),
+}
+
+
+class AIRequestDropped(Exception):
+    """Request waited past its deadline and was never sent to the model."""
+
+
+class AIScheduler:
+    """Admission control for LLM calls: at most `limit` in flight, the rest wait by priority.
+
+    Callers wrap their call in `async with scheduler.slot(priority):`. A free
+    slot goes to the waiting request with the best (priority, arrival) pair; a
+    request still waiting when its deadline passes is dropped with
+    AIRequestDropped instead of being sent late. The blocking SDK / HTTP calls
+    run on the scheduler's own thread pool (same size as the limit) rather
+    than the loop's default executor.
+    """
+
+    def __init__(self, limit: int = None):
+        self.limit = max(1, limit or int(os.getenv("AI_CONCURRENCY", 2)))
+        self.executor = ThreadPoolExecutor(max_workers=self.limit, thread_name_prefix="ai")
+        self.active = 0
+        self._waiting: List[Tuple[int, int, float, asyncio.Future]] = [] # (priority, seq, enqueued, gate)
+        self._seq = itertools.count()
+        self.queued: Dict[int, int] = {p: 0 for p in CLASS_NAMES}
+        self.completed: Dict[int, int] = {p: 0 for p in CLASS_NAMES}
+        self.dropped: Dict[int, int] = {p: 0 for p in CLASS_NAMES}
+        self.max_depth = 0
+        self.wait_total = 0.0 # Seconds spent queued by requests that got a slot
+        self.admitted = 0
+
+    @property
+    def depth(self) -> int:
+        return sum(self.queued.values())
+
+    @asynccontextmanager
+    async def slot(self, priority: int, deadline: Optional[float] = None):
+        """Hold one of the `limit` slots for the duration of the block.
+
+        deadline: seconds this request may wait (default per class, see DEFAULT_DEADLINES).
+        """
+        enqueued = time.monotonic()
+        if self.active < self.limit and not self.depth: # Heap may still hold dropped entries
+            self.active += 1
+        else:
+            wait = deadline if deadline is not None else DEFAULT_DEADLINES.get(priority, 60.0)
+            gate = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiting, (priority, next(self._seq), enqueued, gate))
+            self.queued[priority] += 1
+            self.max_depth = max(self.max_depth, self.depth)
+            try:
+                await asyncio.wait((gate,), timeout=wait)
+            except asyncio.CancelledError:
+                if gate.done():
+                    self._release() # Slot was handed over just as we were cancelled: pass it on
+                else:
+                    self._abandon(gate, priority)
+                raise
+            if not gate.done():
+                # Stale: still no slot after `wait` seconds. The heap entry is skipped later
+                self._abandon(gate, priority)
+                self.dropped[priority] += 1
+                logger.warning(f"Dropping stale {CLASS_NAMES.get(priority, priority)} AI request (waited {wait:g}s)")
+                raise AIRequestDropped(f"no slot within {wait:g}s")
+        self.admitted += 1
+        self.wait_total += time.monotonic() - enqueued
+        try:
+            yield
+        finally:
+            self.completed[priority] += 1
+            self._release()
+
+    def _abandon(self, gate: asyncio.Future, priority: int):
+        gate.cancel()
+        self.queued[priority] -= 1
+
+    def _release(self):
+        """Hand the freed slot to the best request still waiting, or give it back."""
+        while self._waiting:
+            priority, _, _, gate = heapq.heappop(self._waiting)
+            if gate.done():
+                continue # Dropped or cancelled while queued (already uncounted)
+            self.queued[priority] -= 1
+            gate.set_result(None) # Slot moves straight to this request: active count unchanged
+            return
+        self.active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queue_depth": self.depth,
+            "max_queue_depth": self.max_depth,
+            "queued": {CLASS_NAMES[p]: n for p, n in self.queued.items()},
+            "completed": {CLASS_NAMES[p]: n for p, n in self.completed.items()},
+            "dropped": {CLASS_NAMES[p]: n for p, n in self.dropped.items()},
+            "avg_wait_ms": round(1000 * self.wait_total / self.admitted, 1) if self.admitted else None,
+        }
@@ -0,0 +1,228 @@
+import heapq
+import itertools
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+AUTO_RESOLVE_DELAY_MS = 15000 # Alerts with an AI suggestion (or a machine failure) act after this long
+RESOLVED_LINGER_MS = 10000 # Resolved alerts stay visible this long, then are dropped
+
+# Deadline kinds on the heap
+RESOLVE = "resolve"
+CLEANUP = "cleanup"
+
+SEVERITY_RANK = {"low": 0, "medium": 1, "warning": 2, "high": 3, "critical": 4}
+
+
+@dataclass
+class Alert:
+    id: str
+    machine_id: str
+    metric: str # "temperature", "vibration", ..., "wear", or "machine" for status failures
+    kind: str # Anomaly type: physics_violation, rate_of_change, system_failure, ...
+    severity: str
+    message: str
+    timestamp: float # JS ms, last time the anomaly was seen
+    created_at: float # JS ms, start of the current episode (reset on reactivation)
+    count: int = 1
+    resolved: bool = False
+    resolved_at: Optional[float] = None
+    suggested_action: Optional[str] = None
+    root_cause: Optional[str] = None
+    generation: int = 0 # Bumped on every reschedule; older heap entries are ignored
+
+    @property
+    def key(self) -> str:
+        return f"{self.machine_id}_{self.metric}"
+
+    @property
+    def is_machine_failure(self) -> bool:
+        return self.severity == "critical" and self.kind == "system_failure"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Frontend shape (see Alert in frontend/types/factory.ts)."""
+        data = {
+            "id": self.id,
+            "machineId": self.machine_id,
+            "type": "system",
+            "severity": self.severity,
+            "message": self.message,
+            "timestamp": self.timestamp,
+            "created_at": self.created_at,
+            "count": self.count,
+            "resolved": self.resolved,
+        }
+        if self.resolved_at is not None:
+            data["resolved_at"] = self.resolved_at
+        if self.suggested_action is not None:
+            data["suggested_action"] = self.suggested_action
+        if self.root_cause is not None:
+            data["root_cause"] = self.root_cause
+        return data
+
+
+def anomaly_metric(anomaly: Dict[str, Any]) -> str:
+    # Detector anomalies carry "metric"; fall back to the message's first word for anything older
+    return anomaly.get("metric") or anomaly["message"].split(" ")[0].lower()
+
+
+class AlertStore:
+    """Active alerts, one per machine + metric, with a deadline heap and lookup indexes.
+
+    Auto-resolve and cleanup times go on a min-heap of (deadline, seq, kind,
+    key, generation), so a tick only touches the alerts that are due instead of
+    scanning the table. Rescheduling bumps the alert's generation and pushes a
+    new entry; stale entries are skipped when they surface. Alerts are also
+    indexed by machine and by severity, and resolved ones are kept in their own
+    set for the "still showing" window.
+    """
+
+    def __init__(self):
+        self.alerts: Dict[str, Alert] = {} # key -> Alert
+        self.by_machine: Dict[str, Set[str]] = {}
+        self.by_severity: Dict[str, Set[str]] = {}
+        self.resolved: Dict[str, Alert] = {} # key -> Alert, insertion ordered
+        self._heap: List[Tuple[float, int, str, str, int]] = []
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.alerts)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.alerts
+
+    def get(self, key: str) -> Optional[Alert]:
+        return self.alerts.get(key)
+
+    def clear(self):
+        self.alerts.clear()
+        self.by_machine.clear()
+        self.by_severity.clear()
+        self.resolved.clear()
+        self._heap.clear()
+
+    def query(self, machine_id: Optional[str] = None, severity: Optional[str] = None) -> List[Alert]:
+        """Alerts for a machine and/or severity via the indexes, newest first."""
+        keys = None
+        if machine_id is not None:
+            keys = self.by_machine.get(machine_id, set())
+        if severity is not None:
+            matching = self.by_severity.get(severity, set())
+            keys = matching if keys is None else keys & matching
+        alerts = self.alerts.values() if keys is None else [self.alerts[key] for key in keys]
+        return sorted(alerts, key=lambda alert: alert.timestamp, reverse=True)
+
+    def _schedule(self, alert: Alert, kind: str, deadline: float):
+        alert.generation += 1
+        heapq.heappush(self._heap, (deadline, next(self._seq), kind, alert.key, alert.generation))
+
+    def _schedule_resolve(self, alert: Alert):
+        if alert.suggested_action is not None or alert.is_machine_failure:
+            self._schedule(alert, RESOLVE, alert.created_at + AUTO_RESOLVE_DELAY_MS)
+        else:
+            alert.generation += 1 # Nothing to act on (yet): drop any pending deadline
+
+    def record(self, anomaly: Dict[str, Any], now_ms: float) -> Tuple[Alert, bool, bool]:
+        """Add or refresh the alert for this anomaly; returns (alert, created, escalated).
+
+        escalated: an existing alert was raised to a higher severity, so its
+        analysis is stale (cleared here) and needs to be run again.
+        """
+        metric = anomaly_metric(anomaly)
+        key = f"{anomaly['machine_id']}_{metric}"
+        alert = self.alerts.get(key)
+        if alert is None:
+            alert = Alert(
+                id=str(uuid.uuid4()),
+                machine_id=anomaly["machine_id"],
+                metric=metric,
+                kind=anomaly["type"],
+                severity=anomaly["severity"].lower(),
+                message=anomaly["message"],
+                timestamp=now_ms,
+                created_at=now_ms,
+            )
+            self.alerts[key] = alert
+            self.by_machine.setdefault(alert.machine_id, set()).add(key)
+            self.by_severity.setdefault(alert.severity, set()).add(key)
+            self._schedule_resolve(alert)
+            return alert, True, False
+
+        severity = anomaly["severity"].lower()
+        escalated = SEVERITY_RANK.get(severity, 0) > SEVERITY_RANK.get(alert.severity, 0)
+        if escalated:
+            # e.g. warning -> critical: new kind and severity, and the old suggestion no longer applies
+            self._index_severity(alert, severity)
+            alert.kind = anomaly["type"]
+            alert.suggested_action = None
+            alert.root_cause = None
+            alert.created_at = now_ms
+
+        if alert.resolved:
+            # Reactivate: a new episode, so the resolve clock starts over
+            alert.resolved = False
+            alert.resolved_at = None
+            alert.created_at = now_ms
+            self.resolved.pop(key, None)
+            self._schedule_resolve(alert)
+        elif escalated:
+            self._schedule_resolve(alert) # Drops the old deadline (or sets one for a machine failure)
+        alert.count += 1
+        alert.timestamp = now_ms
+        alert.message = anomaly["message"] # Value might change
+        return alert, False, escalated
+
+    def _index_severity(self, alert: Alert, severity: str):
+        keys = self.by_severity.get(alert.severity)
+        if keys is not None:
+            keys.discard(alert.key)
+            if not keys:
+                del self.by_severity[alert.severity]
+        alert.severity = severity
+        self.by_severity.setdefault(severity, set()).add(alert.key)
+
+    def attach_analysis(self, key: str, suggested_action: str, root_cause: str,
+                        severity: Optional[str] = None) -> Optional[Alert]:
+        """AI analysis finished: store it and start the auto-resolve clock.
+
+        severity: what the analysis was asked about; a late answer for an alert
+        that has since been escalated is dropped (the new analysis will land).
+        """
+        alert = self.alerts.get(key)
+        if alert is None or (severity is not None and severity != alert.severity):
+            return None
+        alert.suggested_action = suggested_action
+        alert.root_cause = root_cause
+        if not alert.resolved:
+            self._schedule_resolve(alert)
+        return alert
+
+    def resolve(self, alert: Alert, now_ms: float, note: Optional[str] = None):
+        alert.resolved = True
+        alert.resolved_at = now_ms
+        if note and note not in (alert.suggested_action or ""):
+            alert.suggested_action = f"{alert.suggested_action or ''} {note}".strip()
+        self.resolved[alert.key] = alert
+        self._schedule(alert, CLEANUP, now_ms + RESOLVED_LINGER_MS)
+
+    def remove(self, key: str):
+        alert = self.alerts.pop(key, None)
+        if alert is None:
+            return
+        self.resolved.pop(key, None)
+        for index, field in ((self.by_machine, alert.machine_id), (self.by_severity, alert.severity)):
+            keys = index.get(field)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del index[field]
+
+    def pop_due(self, now_ms: float) -> Iterator[Tuple[str, Alert]]:
+        """Yields (kind, alert) for every live deadline that has passed (strictly before now_ms)."""
+        heap = self._heap
+        while heap and heap[0][0] < now_ms:
+            _, _, kind, key, generation = heapq.heappop(heap)
+            alert = self.alerts.get(key)
+            if alert is None or alert.generation != generation:
+                continue # Rescheduled, reactivated or removed since
+            yield kind, alert
@@ -1,9 +1,202 @@
-from typing import Dict, Any, List, Optional
+import math
+import time
+from typing import Dict, Any, List, Optional, Tuple
 from .schemas import MachineData
 
+# Optional: detect_batch vectorizes with NumPy, otherwise it loops over detect()
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+# Streaming detector tuning (per machine + metric stream)
+EWMA_ALPHA = 0.05 # Weight of the newest sample in the running mean / variance
+Z_LIMIT = 4.0 # Flag samples this many standard deviations above the running mean
+CUSUM_K = 1.0 # Allowed drift per sample before CUSUM accumulates, in standard deviations
+CUSUM_H = 8.0 # CUSUM alarm level, in standard deviations
+WARMUP = 30 # Samples before z-score / CUSUM may fire (after every restart)
+SLOPE_ALPHA = 0.2 # Smoothing of the rate-of-change estimate
+TREND_ALPHA = 0.05 # Memory of the slope-vs-value regression used to find where a rise levels off
+ROC_MIN_SLOPE = 0.25 # Ignore rises slower than this (units per second): sensor noise, not a trend
+ROC_HORIZON = 30.0 # Warn when the warning limit is projected to be reached within this many seconds
+ROC_FLOOR = 0.6 # ... and the reading is already above this fraction of the warning limit
+MIN_STD = 0.05 # Floor for the standard deviation, so flat signals don't turn every wobble into 10 sigma
+TREND_SUFFIX = "_trend" # Streaming anomalies get their own alert ("temperature_trend"), apart from the limit checks
+
+
+class MetricStream:
+    """Online statistics for one machine metric: EWMA mean / variance, an upper
+    CUSUM, an EWMA slope and an EWMA regression of slope against value (to see
+    where a rise levels off). A handful of floats per stream, no history kept."""
+    __slots__ = ("n", "mean", "var", "cusum", "slope", "t_mean", "s_mean", "tt_cov", "ts_cov",
+                 "last_value", "last_ts")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.cusum = 0.0
+        self.slope = 0.0
+        self.t_mean = self.s_mean = self.tt_cov = self.ts_cov = 0.0
+        self.last_value = None
+        self.last_ts = None
+
+    def update(self, value: float, ts: float) -> Tuple[float, bool]:
+        """Add a sample; returns (z-score against the state before it, CUSUM alarm)."""
+        if self.n == 0:
+            self.n = 1
+            self.mean = value
+            self.last_value, self.last_ts = value, ts
+            return 0.0, False
+
+        std = max(math.sqrt(self.var), MIN_STD)
+        deviation = value - self.mean
+        z = deviation / std
+
+        # Upper CUSUM: accumulates only sustained excursions above the mean (after warm-up)
+        drift = False
+        if self.n >= WARMUP:
+            self.cusum = max(0.0, self.cusum + z - CUSUM_K)
+            if self.cusum > CUSUM_H:
+                drift = True
+                self.cusum = 0.0 # Re-arm
+
+        dt = ts - self.last_ts
+        if dt > 0:
+            rate = (value - self.last_value) / dt
+            self.slope += SLOPE_ALPHA * (rate - self.slope)
+            # EWMA moments for rate ~ a + c * value (first-order heating: c < 0, levels off at rate 0)
+            dv, dr = value - self.t_mean, rate - self.s_mean
+            self.t_mean += TREND_ALPHA * dv
+            self.s_mean += TREND_ALPHA * dr
+            self.tt_cov = (1 - TREND_ALPHA) * (self.tt_cov + TREND_ALPHA * dv * dv)
+            self.ts_cov = (1 - TREND_ALPHA) * (self.ts_cov + TREND_ALPHA * dv * dr)
+
+        self.mean += EWMA_ALPHA * deviation
+        self.var = (1 - EWMA_ALPHA) * (self.var + EWMA_ALPHA * deviation * deviation)
+        self.n += 1
+        self.last_value, self.last_ts = value, ts
+        return (z if self.n > WARMUP else 0.0), drift
+
+    def eta(self, value: float, limit: float) -> Optional[float]:
+        """Projected seconds until `limit` is reached (None if the trend never gets there)."""
+        if self.slope < ROC_MIN_SLOPE or value >= limit:
+            return None
+        if self.tt_cov > MIN_STD and self.ts_cov < 0:
+            # Rise slows as the value climbs (heating against Newton cooling):
+            # first-order approach to the value where the fitted rate reaches 0
+            c = self.ts_cov / self.tt_cov
+            settle = self.t_mean - self.s_mean / c
+            if settle <= limit:
+                return None
+            if settle - value > 0:
+                return math.log((settle - value) / (settle - limit)) / -c
+        return (limit - value) / self.slope
+
+
+class StreamBank:
+    """Structure-of-arrays twin of MetricStream: one metric across many machines (NumPy).
+
+    Row per machine id, one array per MetricStream field; update() advances any
+    subset of rows in a single pass with the same arithmetic as MetricStream.update.
+    """
+    FIELDS = ("n", "mean", "var", "cusum", "slope", "t_mean", "s_mean", "tt_cov", "ts_cov",
+              "last_value", "last_ts")
+
+    def __init__(self, capacity: int = 64):
+        self.rows: Dict[str, int] = {}
+        self.capacity = capacity
+        self._last_ids: List[str] = []
+        self._last_slots = np.zeros(0, dtype=np.intp)
+        for f in self.FIELDS:
+            setattr(self, f, np.zeros(capacity))
+
+    def slots(self, machine_ids: List[str]) -> "np.ndarray":
+        if machine_ids == self._last_ids:
+            return self._last_slots # Same machines as last tick (the usual case)
+        rows = self.rows
+        for mid in machine_ids:
+            if mid not in rows:
+                rows[mid] = len(rows)
+        if len(rows) > self.capacity:
+            grow = max(len(rows), self.capacity * 2)
+            for f in self.FIELDS:
+                arr = np.zeros(grow)
+                arr[:self.capacity] = getattr(self, f)
+                setattr(self, f, arr)
+            self.capacity = grow
+        self._last_ids = machine_ids
+        self._last_slots = np.fromiter((rows[mid] for mid in machine_ids), dtype=np.intp, count=len(machine_ids))
+        return self._last_slots
+
+    def reset(self, idx: "np.ndarray"):
+        for f in self.FIELDS:
+            getattr(self, f)[idx] = 0.0
+
+    def update(self, idx: "np.ndarray", values: "np.ndarray", ts: float):
+        """Returns (z, drift, mean before the update) for the given rows."""
+        n, mean, var, last_value, last_ts = self.n[idx], self.mean[idx], self.var[idx], self.last_value[idx], self.last_ts[idx]
+        first = n == 0
+
+        std = np.maximum(np.sqrt(var), MIN_STD)
+        deviation = values - mean
+        z = deviation / std
+
+        warm = n >= WARMUP
+        cusum = np.where(warm, np.maximum(0.0, self.cusum[idx] + z - CUSUM_K), self.cusum[idx])
+        drift = warm & (cusum > CUSUM_H)
+        cusum[drift] = 0.0
+
+        dt = ts - last_ts
+        moving = (dt > 0) & ~first
+        rate = np.where(moving, (values - last_value) / np.where(moving, dt, 1.0), 0.0)
+        slope = self.slope[idx]
+        t_mean, s_mean, tt_cov, ts_cov = self.t_mean[idx], self.s_mean[idx], self.tt_cov[idx], self.ts_cov[idx]
+        dv, dr = values - t_mean, rate - s_mean
+        self.slope[idx] = np.where(moving, slope + SLOPE_ALPHA * (rate - slope), slope)
+        self.t_mean[idx] = np.where(moving, t_mean + TREND_ALPHA * dv, t_mean)
+        self.s_mean[idx] = np.where(moving, s_mean + TREND_ALPHA * dr, s_mean)
+        self.tt_cov[idx] = np.where(moving, (1 - TREND_ALPHA) * (tt_cov + TREND_ALPHA * dv * dv), tt_cov)
+        self.ts_cov[idx] = np.where(moving, (1 - TREND_ALPHA) * (ts_cov + TREND_ALPHA * dv * dr), ts_cov)
+
+        # First sample of a stream only seeds the mean (MetricStream.update's early return)
+        self.cusum[idx] = np.where(first, self.cusum[idx], cusum)
+        self.mean[idx] = np.where(first, values, mean + EWMA_ALPHA * deviation)
+        self.var[idx] = np.where(first, var, (1 - EWMA_ALPHA) * (var + EWMA_ALPHA * deviation * deviation))
+        self.n[idx] = n + 1
+        self.last_value[idx] = values
+        self.last_ts[idx] = ts
+
+        z = np.where(first | (n + 1 <= WARMUP), 0.0, z)
+        return z, drift & ~first, mean
+
+    def eta(self, idx: "np.ndarray", values: "np.ndarray", limit: "np.ndarray") -> "np.ndarray":
+        """MetricStream.eta for many rows; inf where the trend never reaches `limit`."""
+        slope, t_mean, s_mean = self.slope[idx], self.t_mean[idx], self.s_mean[idx]
+        tt_cov, ts_cov = self.tt_cov[idx], self.ts_cov[idx]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            levels = (tt_cov > MIN_STD) & (ts_cov < 0)
+            c = np.where(levels, ts_cov / np.where(levels, tt_cov, 1.0), -1.0)
+            settle = t_mean - s_mean / c
+            approach = np.log((settle - values) / (settle - limit)) / -c
+            linear = (limit - values) / slope
+            eta = np.where(levels & (settle - values > 0), approach, linear)
+            eta = np.where(levels & (settle <= limit), np.inf, eta)
+        return np.where((slope >= ROC_MIN_SLOPE) & (values < limit), eta, np.inf)
+
+
+# Compiled limits for one machine: ((metric, critical, warn_at, trend_limit), ...)
+# warn_at: pre-emptive warning level; trend_limit: what the rate-of-change check projects onto
+Limits = Tuple[Tuple[str, float, float, float], ...]
+
+
 class AnomalyDetector:
     def __init__(self):
-        # Define thresholds
+        # Fallback thresholds per machine type, until the simulation sends its real per-machine profile
         self.thresholds = {
             "Cutter": {
                 "temperature": {"warning": 95.0, "critical": 110.0},
@@ -16,16 +209,51 @@ class AnomalyDetector:
                 "jam_rate": {"warning": 0.5, "critical": 0.8}
             }
         }
+        self.type_limits: Dict[str, Limits] = {
+            m_type: tuple((metric, l["critical"], l["critical"] * 0.85, l["warning"]) for metric, l in metrics.items())
+            for m_type, metrics in self.thresholds.items()
+        }
+        # machine_id -> Limits, compiled from the simulation's "thresholds" message (see load_profile)
+        self.machine_limits: Dict[str, Limits] = {}
+        self.profile_version = None
+        # (machine type, metric names) -> (machine ids, profile version, per-metric limit arrays) for detect_batch
+        self._group_limits: Dict[Tuple[str, Tuple[str, ...]], tuple] = {}
+        # (machine_id, metric) -> MetricStream, for every thresholded metric (detect)
+        self.streams: Dict[Tuple[str, str], MetricStream] = {}
+        # (machine type, metric) -> StreamBank (detect_batch). Use one entry point per detector.
+        self.banks: Dict[Tuple[str, str], "StreamBank"] = {}
 
-    def detect(self, machine_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def load_profile(self, profile: Dict[str, Any]) -> bool:
+        """Compile the simulation's per-machine thresholds message into machine_limits.
+
+        {"type": "thresholds", "version": n, "machines": {id: {"type", "thresholds": {metric: {"critical", "safe"}}}}}
+        The simulation's own failure risk starts climbing past "safe", so that is both the
+        warning level and the rate-of-change target. Returns False if this version is already loaded.
+        """
+        version = profile.get("version")
+        if version is not None and version == self.profile_version:
+            return False
+        compiled = {}
+        for machine_id, entry in profile.get("machines", {}).items():
+            compiled[machine_id] = tuple(
+                (metric, float(l["critical"]), float(l["safe"]), float(l["safe"]))
+                for metric, l in entry.get("thresholds", {}).items()
+            )
+        self.machine_limits = compiled
+        self.profile_version = version
+        self._group_limits.clear()
+        return True
+
+    def limits_for(self, machine_data: Dict[str, Any]) -> Limits:
+        limits = self.machine_limits.get(machine_data.get("id"))
+        if limits is None:
+            # No profile (yet) for this machine: per-type fallback, or nothing beyond status / wear
+            limits = self.type_limits.get(machine_data.get("type"), ())
+        return limits
+
+    def detect(self, machine_data: Dict[str, Any], timestamp: Optional[float] = None) -> List[Dict[str, Any]]:
         anomalies = []
-        m_type = machine_data.get("type")
-        
-        if m_type not in self.thresholds:
-            # Still check generic fields like status/wear for all machines
-            pass
-            
-        thresholds = self.thresholds.get(m_type, {})
+        limits = self.limits_for(machine_data)
         
         # 0. Global Check: Ignore if Under Repair
         status = machine_data.get("status")
@@ -37,6 +265,8 @@ class AnomalyDetector:
              anomalies.append({
                 "machine_id": machine_data["id"],
                 "type": "system_failure",
+                "metric": "machine",
+                "value": None,
                 "severity": "critical",
                 "message": f"machine failure: Status is {status}"
             })
@@ -48,6 +278,8 @@ class AnomalyDetector:
                  anomalies.append({
                     "machine_id": machine_data["id"],
                     "type": "part_failure",
+                    "metric": "wear",
+                    "value": float(wear),
                     "severity": "critical",
                     "message": f"wear critical: {wear:.2f} >= 1.0"
                 })
@@ -55,29 +287,243 @@ class AnomalyDetector:
                  anomalies.append({
                      "machine_id": machine_data["id"],
                      "type": "wear_warning",
+                     "metric": "wear",
+                     "value": float(wear),
                      "severity": "warning",
                      "message": f"wear high: {wear:.2f} > 0.8"
                  })
         
-        for metric, limits in thresholds.items():
+        for metric, critical, warn_at, _ in limits:
             val = machine_data.get(metric)
             if val is None: continue
             
             # Critical Check
-            if val > limits["critical"]:
+            if val > critical:
                 anomalies.append({
                     "machine_id": machine_data["id"],
                     "type": "physics_violation",
+                    "metric": metric,
+                    "value": float(val),
                     "severity": "critical",
-                    "message": f"{metric} critical: {val:.1f} > {limits['critical']}"
+                    "message": f"{metric} critical: {val:.1f} > {critical:.1f}"
                 })
-            # Warning Check (Proactive - 85% of critical)
-            elif val > (limits["critical"] * 0.85):
+            # Warning Check (Proactive - safe limit, or 85% of critical for the fallback table)
+            elif val > warn_at:
                 anomalies.append({
                      "machine_id": machine_data["id"],
                      "type": "pre_emptive_warning",
+                     "metric": metric,
+                     "value": float(val),
                      "severity": "warning",
-                     "message": f"{metric} warning: {val:.1f} approaching {limits['critical']}"
+                     "message": f"{metric} warning: {val:.1f} approaching {critical:.1f}"
                 })
-                
+
+        # [NEW] Streaming detectors: catch trends before the fixed limits trip
+        anomalies.extend(self._detect_streaming(machine_data, limits, timestamp or time.time()))
         return anomalies
+
+    def _detect_streaming(self, machine_data: Dict[str, Any], limits: Limits, ts: float) -> List[Dict[str, Any]]:
+        anomalies = []
+        machine_id = machine_data["id"]
+        running = machine_data.get("status") == "RUNNING"
+
+        for metric, _, _, trend_limit in limits:
+            key = (machine_id, metric)
+            stream = self.streams.get(key)
+            if stream is None:
+                stream = self.streams[key] = MetricStream()
+            val = machine_data.get(metric)
+            if not running or val is None:
+                # Stopped / starved / broken machines follow different physics: start over on restart
+                if stream.n:
+                    stream.reset()
+                continue
+
+            mean_before = stream.mean
+            z, drift = stream.update(float(val), ts)
+
+            if z > Z_LIMIT:
+                anomalies.append({
+                    "machine_id": machine_id,
+                    "type": "statistical_outlier",
+                    "metric": metric + TREND_SUFFIX,
+                    "value": float(val),
+                    "severity": "low",
+                    "message": f"{metric} spike: {val:.1f} is {z:.1f} sigma above recent mean {mean_before:.1f}"
+                })
+            elif drift:
+                anomalies.append({
+                    "machine_id": machine_id,
+                    "type": "drift",
+                    "metric": metric + TREND_SUFFIX,
+                    "value": float(val),
+                    "severity": "low",
+                    "message": f"{metric} drift: sustained rise above recent mean {mean_before:.1f} (CUSUM)"
+                })
+
+            # Rate of change: project the temperature trend onto the warning limit
+            if metric == "temperature" and ROC_FLOOR * trend_limit < val:
+                eta = stream.eta(val, trend_limit)
+                if eta is not None and eta < ROC_HORIZON:
+                    anomalies.append({
+                        "machine_id": machine_id,
+                        "type": "rate_of_change",
+                        "metric": metric + TREND_SUFFIX,
+                        "value": float(val),
+                        "severity": "warning",
+                        "message": f"{metric} rising: {stream.slope:+.2f}/s at {val:.1f}, {trend_limit:.1f} in ~{eta:.0f}s"
+                    })
+        return anomalies
+
+    def detect_batch(self, machines: List[Dict[str, Any]], timestamp: Optional[float] = None) -> List[Dict[str, Any]]:
+        """detect() for a whole tick's machines at once, same anomalies in the same order.
+
+        Metrics are packed into one array per machine type and metric, limits and
+        streaming detectors run as array ops, and anomaly dicts / messages are
+        only built for machines that trip something.
+        """
+        ts = timestamp or time.time()
+        if not HAS_NUMPY:
+            found = []
+            for machine in machines:
+                found.extend(self.detect(machine, ts))
+            return found
+
+        # Under repair: skipped entirely, as in detect()
+        machines = [m for m in machines if m.get("status") not in ("WAITING_FOR_REPAIR", "REPAIRING")]
+        per_machine: List[List[Dict[str, Any]]] = [[] for _ in machines]
+        if not machines:
+            return []
+
+        # 1. Status / wear for every machine
+        statuses = [m.get("status") for m in machines]
+        wear = np.array([m.get("wear_level") for m in machines], dtype=float) # None -> nan
+        for i in np.flatnonzero(np.array(statuses) == "ERROR"):
+            per_machine[i].append({
+                "machine_id": machines[i]["id"],
+                "type": "system_failure",
+                "metric": "machine",
+                "value": None,
+                "severity": "critical",
+                "message": f"machine failure: Status is {statuses[i]}"
+            })
+        for i in np.flatnonzero(wear > 0.8):
+            if wear[i] >= 1.0:
+                per_machine[i].append({
+                    "machine_id": machines[i]["id"],
+                    "type": "part_failure",
+                    "metric": "wear",
+                    "value": float(wear[i]),
+                    "severity": "critical",
+                    "message": f"wear critical: {wear[i]:.2f} >= 1.0"
+                })
+            else:
+                per_machine[i].append({
+                    "machine_id": machines[i]["id"],
+                    "type": "wear_warning",
+                    "metric": "wear",
+                    "value": float(wear[i]),
+                    "severity": "warning",
+                    "message": f"wear high: {wear[i]:.2f} > 0.8"
+                })
+
+        # 2. Per type: fixed limits, then streaming detectors (metric by metric, like detect())
+        groups: Dict[Tuple[str, Tuple[str, ...]], List[int]] = {}
+        machine_limits = [self.limits_for(m) for m in machines]
+        for i, limits in enumerate(machine_limits):
+            if limits:
+                groups.setdefault((machines[i].get("type"), tuple(l[0] for l in limits)), []).append(i)
+
+        for (m_type, metrics), rows in groups.items():
+            group = [machines[i] for i in rows]
+            ids = [m["id"] for m in group]
+            cached = self._group_limits.get((m_type, metrics))
+            if cached is None or cached[0] != ids or cached[1] != self.profile_version:
+                # Per-machine limits as arrays; rebuilt only when the machine set or the profile changes
+                table = np.array([[l[1:] for l in machine_limits[i]] for i in rows], dtype=float)
+                cached = self._group_limits[(m_type, metrics)] = (ids, self.profile_version, table)
+            table = cached[2] # (machines, metrics, [critical, warn_at, trend_limit])
+            running = np.array([m.get("status") == "RUNNING" for m in group])
+            limit_hits: List[List[Dict[str, Any]]] = [[] for _ in group]
+            stream_hits: List[List[Dict[str, Any]]] = [[] for _ in group]
+
+            for k, metric in enumerate(metrics):
+                crit_at, warn_at, trend_limit = table[:, k, 0], table[:, k, 1], table[:, k, 2]
+                values = np.array([m.get(metric) for m in group], dtype=float) # None -> nan
+                critical = values > crit_at
+                warning = ~critical & (values > warn_at)
+                for j in np.flatnonzero(critical | warning):
+                    if critical[j]:
+                        limit_hits[j].append({
+                            "machine_id": ids[j],
+                            "type": "physics_violation",
+                            "metric": metric,
+                            "value": float(values[j]),
+                            "severity": "critical",
+                            "message": f"{metric} critical: {values[j]:.1f} > {crit_at[j]:.1f}"
+                        })
+                    else:
+                        limit_hits[j].append({
+                            "machine_id": ids[j],
+                            "type": "pre_emptive_warning",
+                            "metric": metric,
+                            "value": float(values[j]),
+                            "severity": "warning",
+                            "message": f"{metric} warning: {values[j]:.1f} approaching {crit_at[j]:.1f}"
+                        })
+
+                bank = self.banks.get((m_type, metric))
+                if bank is None:
+                    bank = self.banks[(m_type, metric)] = StreamBank()
+                slots = bank.slots(ids)
+                live = running & ~np.isnan(values)
+                if not live.all():
+                    # Stopped / starved / broken machines start over on restart
+                    bank.reset(slots[~live])
+                if not live.any():
+                    continue
+                pos = np.flatnonzero(live)
+                idx, vals = slots[pos], values[pos]
+                z, drift, mean_before = bank.update(idx, vals, ts)
+                limit = trend_limit[pos]
+                eta = bank.eta(idx, vals, limit) if metric == "temperature" else None
+                rising = (eta < ROC_HORIZON) & (vals > ROC_FLOOR * limit) if eta is not None else None
+
+                flagged = (z > Z_LIMIT) | drift
+                if rising is not None:
+                    flagged |= rising
+                for k in np.flatnonzero(flagged):
+                    j = pos[k]
+                    if z[k] > Z_LIMIT:
+                        stream_hits[j].append({
+                            "machine_id": ids[j],
+                            "type": "statistical_outlier",
+                            "metric": metric + TREND_SUFFIX,
+                            "value": float(vals[k]),
+                            "severity": "low",
+                            "message": f"{metric} spike: {vals[k]:.1f} is {z[k]:.1f} sigma above recent mean {mean_before[k]:.1f}"
+                        })
+                    elif drift[k]:
+                        stream_hits[j].append({
+                            "machine_id": ids[j],
+                            "type": "drift",
+                            "metric": metric + TREND_SUFFIX,
+                            "value": float(vals[k]),
+                            "severity": "low",
+                            "message": f"{metric} drift: sustained rise above recent mean {mean_before[k]:.1f} (CUSUM)"
+                        })
+                    if rising is not None and rising[k]:
+                        stream_hits[j].append({
+                            "machine_id": ids[j],
+                            "type": "rate_of_change",
+                            "metric": metric + TREND_SUFFIX,
+                            "value": float(vals[k]),
+                            "severity": "warning",
+                            "message": f"{metric} rising: {bank.slope[idx[k]]:+.2f}/s at {vals[k]:.1f}, {limit[k]:.1f} in ~{eta[k]:.0f}s"
+                        })
+
+            for j, i in enumerate(rows):
+                per_machine[i].extend(limit_hits[j])
+                per_machine[i].extend(stream_hits[j])
+
+        return [a for found in per_machine for a in found]
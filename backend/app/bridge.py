@@ -6,26 +6,64 @@ import os
 from sqlalchemy.ext.asyncio import AsyncSession
 from .database import AsyncSessionLocal
 from .models import Event, MachineState
-from .anomaly import AnomalyDetector
+from .anomaly import AnomalyDetector, TREND_SUFFIX
+from .delta import apply_patch
+from .ingest import MachineStateWriter, EventWriter, RollupWriter
+from .retention import RetentionJob
+from .encoding import PayloadCache, decode, decode_interned, encode, HAS_MSGPACK
 
+from .alerts import AlertStore, CLEANUP
+from .prompt_context import autonomy_context
 from .ai import AICollaborator
 import uuid
 import time
 
 logger = logging.getLogger(__name__)
 
+# Alert metric -> auto-resolve command, when the AI suggestion isn't a reset / stop
+METRIC_COMMANDS = {
+    "temperature": "set_speed:500", # Overheating -> Significant slow down
+    "vibration": "set_speed:1500", # Vibration -> Moderate slow down
+    "current": "set_speed:1000", # High Load -> Reduce speed/load
+    "load": "set_speed:1000",
+    "wear": "set_speed:1000", # Wear needs maintenance, slowing down helps delay failure
+}
+
 class DataBridge:
     def __init__(self, simulation_url: str = None):
         self.simulation_url = simulation_url or os.getenv("SIMULATION_URL", "ws://127.0.0.1:8765")
         self.detector = AnomalyDetector()
         self.ai = AICollaborator()
         self.latest_data = {}
-        self.active_alerts = {} # map machine_id + metric -> Alert Dict
+        self.alerts = AlertStore() # machine_id + metric -> Alert, with resolve / cleanup deadlines
         self.last_autonomy_check = 0
         self.last_cleanup = 0
         self.action_history = [] # List of {timestamp, machine_id, command, resulting_temp?}
         self.running = False
         self.autonomy_enabled = True # [NEW] Persist Autonomy State (In-memory for now, could be DB)
+        # Simulation stream: "delta" = snapshot + sequence-numbered patches, "full" = whole state every tick
+        self.stream_mode = os.getenv("SIMULATION_STREAM_MODE", "delta")
+        self.stream_state = None # Simulation state rebuilt from snapshot + deltas
+        self.stream_seq = None
+        # Simulation wire format: "json" (default) or "msgpack" (binary frames with an interned key table)
+        self.wire_encoding = os.getenv("SIMULATION_WIRE_ENCODING", "json")
+        if self.wire_encoding == "msgpack" and not HAS_MSGPACK:
+            logger.warning("SIMULATION_WIRE_ENCODING=msgpack but msgpack is not installed, using JSON")
+            self.wire_encoding = "json"
+        self.wire_keys = None # Key table from the simulation's hello; set once binary frames are on
+        self.hello_requested_at = 0.0 # Last re-subscribe sent because binary frames came without a hello
+        # Bumped whenever latest_data is replaced; keys the encoded payload cache for frontend pushes
+        self.state_version = 0
+        # Notified on every new state_version; push_to_frontend waits on it instead of polling
+        self.state_changed = asyncio.Condition()
+        # Per-tick machine snapshots -> machine_states, written in batches off the receive loop
+        # 1m / 1h rollups are maintained from the same snapshots (see history.py for the query side)
+        self.rollup_writer = RollupWriter()
+        self.state_writer = MachineStateWriter(rollups=self.rollup_writer)
+        # Anomaly events, same write-behind scheme (process_data never opens a DB session)
+        self.event_writer = EventWriter()
+        self.retention = RetentionJob()
+        self.payload_cache = PayloadCache()
 
     def set_autonomy(self, enabled: bool):
         self.autonomy_enabled = enabled
@@ -37,6 +75,10 @@ class DataBridge:
     async def reset_data(self):
         """Hard Factory Reset: Clear DB and Simulation"""
         try:
+            # Don't write pre-reset rows after the wipe
+            self.state_writer.clear()
+            self.event_writer.clear()
+            self.rollup_writer.clear()
             # 1. Clear Database
             async with AsyncSessionLocal() as session:
                 from sqlalchemy import text
@@ -45,15 +87,20 @@ class DataBridge:
                 from .models import Event, MachineState
                 from sqlalchemy import delete
                 
+                from .models import MachineStateMinute, MachineStateHour
                 await session.execute(delete(Event))
                 await session.execute(delete(MachineState))
+                await session.execute(delete(MachineStateMinute))
+                await session.execute(delete(MachineStateHour))
                 await session.commit()
                 logger.warning("Database Cleared via Reset")
 
             # 2. Reset In-Memory State
-            self.active_alerts = {}
+            self.alerts.clear()
+            self.ai.analysis_cache.clear()
             self.command_history = {}
             self.latest_data = {}
+            await self._publish_state()
             self.action_history = []
             
             # 3. Send Reset to Simulation
@@ -65,53 +112,107 @@ class DataBridge:
             return False
 
     async def cleanup_old_data(self):
-        """Delete data older than 30 days"""
+        """Delete old data: events after 30 days, metric history per tier (see history.RETENTION)"""
         try:
-            # 30 days in seconds = 30 * 24 * 3600 = 2,592,000
-            retention_period = 2592000
-            # retention_period = 60 # Test: 1 minute
-            
-            cutoff_date = time.time() - retention_period
-            
-            # Since SQLAlchemy uses DateTime objects, we might need to handle this carefully if using raw SQL or ORM.
-            # But the requirement is simple. Let's use raw SQL for efficiency or a simple delete.
-            # Note: models.py uses DateTime(timezone=True) with server_default=func.now()
-            # We can rely on the DB to handle the comparison if we pass a datetime.datetime object.
-            
-            from datetime import datetime, timedelta, timezone
-            cutoff_dt = datetime.now(timezone.utc) - timedelta(days=30)
-            
-            async with AsyncSessionLocal() as session:
-                from sqlalchemy import delete
-                from .models import Event, MachineState
-                
-                # Delete old EVENTS
-                await session.execute(delete(Event).where(Event.timestamp < cutoff_dt))
-                
-                # Delete old MACHINE STATES
-                await session.execute(delete(MachineState).where(MachineState.timestamp < cutoff_dt))
-                
-                await session.commit()
-                logger.info(f"Data Cleanup Completed (Cutoff: {cutoff_dt})")
-                
+            # [NEW] Chunked + resumable (see retention.py); an unfinished run continues on the next call
+            deleted = await self.retention.run()
+            logger.info(f"Data Cleanup Completed: {deleted}")
         except Exception as e:
             logger.error(f"Cleanup Error: {e}")
 
     async def connect(self):
         self.running = True
+        self.state_writer.start()
+        self.event_writer.start()
+        self.rollup_writer.start()
         while self.running:
             try:
                 async with websockets.connect(self.simulation_url) as websocket:
                     logger.info(f"Connected to Simulation at {self.simulation_url}")
                     self.websocket = websocket # Store connection
+                    self.stream_state = None
+                    self.stream_seq = None
+                    self.wire_keys = None
+                    self.hello_requested_at = 0.0
+                    self.detector.profile_version = None # A restarted simulation counts versions from 1 again
+                    if self.stream_mode == "delta" or self.wire_encoding != "json":
+                        await self._subscribe()
                     async for message in websocket:
-                        data = json.loads(message)
-                        await self.process_data(data)
+                        if isinstance(message, bytes):
+                            if self.wire_keys is None:
+                                # Binary frame before the hello: can't read it. Subscribe again (at most every
+                                # 5 s) so the simulation re-sends the key table and a fresh snapshot
+                                if time.time() - self.hello_requested_at > 5.0:
+                                    self.hello_requested_at = time.time()
+                                    logger.warning("Binary frame without a key table. Re-subscribing.")
+                                    await self._subscribe()
+                                continue
+                            message = decode_interned(message, self.wire_keys)
+                        else:
+                            message = decode(message)
+                            if message.get("type") == "hello":
+                                self.wire_keys = message.get("keys", [])
+                                logger.info(f"Simulation stream switched to {message.get('encoding')}")
+                                continue
+                            if message.get("type") == "thresholds":
+                                # Real per-machine limits (sent on connect and whenever the machines are rebuilt)
+                                if self.detector.load_profile(message):
+                                    logger.info(f"Loaded thresholds v{message.get('version')} for {len(message.get('machines', {}))} machines")
+                                continue
+                        data = await self._decode_stream(message)
+                        if data is not None:
+                            await self.process_data(data)
             except Exception as e:
                 logger.error(f"Connection error: {e}. Retrying in 5s...")
                 self.websocket = None
                 await asyncio.sleep(5)
 
+    async def _decode_stream(self, message: dict):
+        """Turns a stream message into a full state dict (None while waiting for a resync)."""
+        kind = message.get("type")
+        if kind is None:
+            return message # Full-state message (legacy / "full" mode)
+
+        if kind == "snapshot":
+            self.stream_state = message["data"]
+            self.stream_seq = message["seq"]
+        elif kind == "delta":
+            if self.stream_state is None or message["seq"] != self.stream_seq + 1:
+                # Missed a tick: deltas no longer line up, ask for a fresh snapshot
+                if self.stream_state is not None:
+                    logger.warning(f"Delta gap (have {self.stream_seq}, got {message['seq']}). Requesting resync.")
+                    self.stream_state = None
+                    await self._send({"action": "resync"})
+                return None
+            try:
+                self.stream_state = apply_patch(self.stream_state, message["ops"])
+            except (KeyError, IndexError, ValueError, TypeError) as e:
+                logger.error(f"Delta apply failed: {e}. Requesting resync.")
+                self.stream_state = None
+                await self._send({"action": "resync"})
+                return None
+            self.stream_seq = message["seq"]
+        else:
+            return None
+
+        # Shallow copy: process_data attaches alerts / autonomy flags at the top level
+        return dict(self.stream_state)
+
+    async def _subscribe(self):
+        # Always JSON: we don't know yet whether the simulation speaks msgpack.
+        # Older simulations ignore unknown actions / fields and keep sending full JSON state
+        subscribe = {"action": "subscribe", "mode": self.stream_mode}
+        if self.wire_encoding != "json":
+            subscribe["encoding"] = self.wire_encoding
+        await self.websocket.send(json.dumps(subscribe))
+
+    async def _send(self, payload: dict):
+        # Commands follow the stream: msgpack once the simulation has confirmed it (hello), else JSON
+        if self.wire_keys is not None:
+            await self.websocket.send(encode(payload, "msgpack"))
+        else:
+            await self.websocket.send(json.dumps(payload))
+
     async def send_command(self, command: dict):
         if hasattr(self, 'websocket') and self.websocket:
             try:
@@ -120,7 +221,7 @@ class DataBridge:
                 if "action" not in payload:
                     payload["action"] = "control"
                 
-                await self.websocket.send(json.dumps(payload))
+                await self._send(payload)
                 logger.info(f"Sent command to simulation: {payload}")
                 
                 # [FIX] Update Command Lock for Manual/API commands too
@@ -139,228 +240,67 @@ class DataBridge:
 
     async def process_data(self, data: dict):
         timestamp = data.get("timestamp")
-        
-        # Prepare list for frontend
-        current_alerts = []
 
         if not hasattr(self, 'command_history'): 
              self.command_history = {} # machine_id -> timestamp
 
-        async with AsyncSessionLocal() as session:
-            for line in data.get("lines", []):
-                for machine in line.get("machines", []):
-                    # 1. Anomaly Detection
-                    
-                    # [FIX] Check Grace Period (Command Lock)
-                    last_cmd_time = self.command_history.get(machine['id'], 0)
-                    if (timestamp - last_cmd_time) < 5.0: # 5 Seconds Grace
-                        # Skip detection while machine is reacting
-                        anomalies = []
-                    else:
-                        anomalies = self.detector.detect(machine)
-                    
-                    for anomaly in anomalies:
-                        # [FIX] Create stable key: machine_id + metric (e.g. "L1-CUT-01_temperature")
-                        metric_name = anomaly['message'].split(" ")[0].lower()
-                        anomaly_key = f"{anomaly['machine_id']}_{metric_name}"
-                        
-                        # Check if we already have this active
-                        existing_alert = self.active_alerts.get(anomaly_key)
-                        
-                        if existing_alert:
-                            # Update existing
-                            # If it was marked resolved but anomaly persists after grace period, un-resolve it?
-                            # Or creates new one? 
-                            # If grace period passed, it's a new (or persisting) issue.
-                            if existing_alert['resolved']:
-                                # Reactivate it
-                                existing_alert['resolved'] = False
-                                existing_alert['count'] += 1
-                                existing_alert['timestamp'] = timestamp * 1000
-                                existing_alert['created_at'] = timestamp * 1000 # [FIX] Reset start time to prevent instant re-resolve loop
-                            else:
-                                existing_alert['timestamp'] = timestamp * 1000 # JS ms
-                                existing_alert['count'] = existing_alert.get('count', 1) + 1
-                                
-                            # Update message (value might change)
-                            existing_alert['message'] = anomaly['message']
-                            current_alerts.append(existing_alert)
-                        else:
-                            # New Alert
-                            new_alert = {
-                                "id": str(uuid.uuid4()),
-                                "machineId": anomaly['machine_id'],
-                                "type": "system",
-                                "severity": anomaly['severity'].lower(),
-                                "message": anomaly['message'],
-                                "timestamp": timestamp * 1000,
-                                "created_at": timestamp * 1000,
-                                "count": 1,
-                                "resolved": False
-                            }
-                            
-                            # AI Analysis for High/Critical OR Persistent Warnings
-                            if new_alert['severity'] in ['high', 'critical', 'warning']:
-                                # Fire-and-forget AI analysis
-                                asyncio.create_task(self._run_ai_analysis(anomaly, anomaly_key, new_alert['id']))
-
-                            self.active_alerts[anomaly_key] = new_alert
-                            current_alerts.append(new_alert)
-                            
-                            # Save event to DB
-                            try:
-                                event = Event(
-                                    machine_id=anomaly["machine_id"],
-                                    type=anomaly["type"],
-                                    severity=anomaly["severity"],
-                                    message=anomaly["message"],
-                                    details=anomaly.get("details", "")
-                                )
-                                session.add(event)
-                                logger.warning(f"New Anomaly: {anomaly['message']}")
-                            except Exception as e:
-                                logger.error(f"DB Error: {e}")
-            
-            await session.commit()
+        # Metric history (buffered, flushed in bulk by the writer's own task)
+        self.state_writer.add_snapshot(data)
 
-        # [NEW] Auto-Resolve Logic
+        # 1. Anomaly Detection: one vectorized pass over the whole tick
+        # [FIX] Check Grace Period (Command Lock): skip machines still reacting to a command (5 Seconds Grace)
+        machines = [
+            machine
+            for line in data.get("lines", [])
+            for machine in line.get("machines", [])
+            if (timestamp - self.command_history.get(machine['id'], 0)) >= 5.0
+        ]
+        anomalies = self.detector.detect_batch(machines, timestamp)
         current_time_ms = timestamp * 1000
-        AUTO_RESOLVE_DELAY_MS = 15000 # 15 Seconds (Faster)
+        touched = {} # alert id -> Alert, in the order they were hit this tick
+        machine_types = None # machine id -> type, built on the first new alert of the tick
+        for anomaly in anomalies:
+            # [FIX] Stable identity: machine_id + metric (e.g. "L1-CUT-01_temperature")
+            alert, created, escalated = self.alerts.record(anomaly, current_time_ms)
+            touched[alert.id] = alert
 
-        # Cleanup Loop
-        keys_to_delete = []
+            if created or escalated:
+                # AI Analysis for High/Critical OR Persistent Warnings (again if the alert got worse)
+                if alert.severity in ['high', 'critical', 'warning']:
+                    if machine_types is None:
+                        machine_types = {m['id']: m.get('type') for m in machines}
+                    # Fire-and-forget AI analysis (cached per anomaly signature, see ai_cache.py)
+                    asyncio.create_task(self._run_ai_analysis(anomaly, alert.key, alert.id, machine_types.get(alert.machine_id)))
 
-        for key, alert in list(self.active_alerts.items()):
-            
-            # 0. Delayed Cleanup Logic
-            if alert['resolved']:
-                resolved_time = alert.get('resolved_at', 0)
-                if (current_time_ms - resolved_time) > 10000: # Keep resolved for 10s
-                    keys_to_delete.append(key)
-                else:
-                     current_alerts.append(alert) # Still show resolved
-                continue
-
-            # Auto-resolve if:
-            # 1. Critical/Warning with AI help
-            # 2. OR Critical Machine Failure (Fast-track)
-            
-            has_suggestion = 'suggested_action' in alert
-            is_critical_failure = alert['severity'] == 'critical' and "machine failure" in alert['message'].lower()
-            
-            if (not alert['resolved'] and (has_suggestion or is_critical_failure)):
-                
-                # Check Time Decay
-                start_time = alert.get('created_at', alert['timestamp'])
-                if (current_time_ms - start_time) > AUTO_RESOLVE_DELAY_MS:
-                     if is_critical_failure and not has_suggestion:
-                         action = "emergency reset"
-                     else:
-                         action = alert.get('suggested_action', '').lower()
-                     
-                     machine_id = alert['machineId']
-                     
-                     logger.info(f"Alert {alert['id']} ({alert['severity']}) is stale. AI taking action: {action}")
-                     
-                     # Map AI response or Alert Type to specific commands
-                     command = None
-                     msg_lower = alert.get('message', '').lower()
-                     
-                     # [FIX] Only process Ignore if it's NOT a critical failure
-                     if "ignore" in action and not is_critical_failure:
-                         # [FIX] Explicit Ignore = Resolve without command
-                         alert['resolved'] = True
-                         alert['resolved_at'] = current_time_ms
-                         
-                         current_suggestion = alert.get('suggested_action', '')
-                         if "(Auto-Ignored)" not in current_suggestion:
-                            alert['suggested_action'] = current_suggestion + " (Auto-Ignored)"
-                         continue
-
-                     if is_critical_failure or "reset" in action or "machine failure" in msg_lower:
-                         command = "reset"
-                     elif "stop" in action or "halt" in action: 
-                         command = "stop"
-                     
-                     # Specific Logic based on Metric (from message)
-                     elif "temperature" in msg_lower:
-                         # Overheating -> Significant slow down
-                         command = "set_speed:500"
-                     elif "vibration" in msg_lower:
-                         # Vibration -> Moderate slow down
-                         command = "set_speed:1500"
-                     elif "current" in msg_lower or "load" in msg_lower:
-                         # High Load -> Reduce speed/load
-                         command = "set_speed:1000"
-                     elif "wear" in msg_lower:
-                         pass # Wear needs maintenance, slowing down helps delay failure
-                         command = "set_speed:1000"
-                     elif "speed" in action or "slow" in action:
-                         command = "set_speed:1200" # Fallback
-                     elif "maintenance" in action:
-                          command = "set_speed:1000"
-                     
-                     if command:
-                         logger.info(f"Auto-Resolve Executing: {command} for {alert['machineId']}")
-                     
-                     if command:
-                         # Execute
-                         await self.send_command({
-                             "machine_id": machine_id, 
-                             "command": command
-                         })
-                         
-                         # Update Command History (Lock)
-                         self.command_history[machine_id] = timestamp
-                         
-                         # Update Alert
-                         alert['resolved'] = True
-                         alert['resolved_at'] = current_time_ms
-                         
-                         # [FIX] Prevent duplicate suffix
-                         if "Auto-Executed" not in alert.get('suggested_action', ''):
-                            alert['suggested_action'] += " (Auto-Executed)"
-                         
-                         # DO NOT DELETE IMMEDIATELY
-                         # keys_to_delete.append(key) -> Handled by Cleanup Loop next tick
-                         
-                     else:
-                         logger.warning(f"AI suggested '{action}' but no mapping found.")
-        
-        # Apply Deletions
-        for key in keys_to_delete:
-            del self.active_alerts[key]
+                # Save event to DB (write-behind: queued here, committed in batches by event_writer)
+                self.event_writer.add_event(anomaly)
+                logger.warning(f"{'New' if created else 'Escalated'} Anomaly: {anomaly['message']}")
+
+        # [NEW] Auto-Resolve / Cleanup: only alerts whose deadline has passed (see AlertStore)
+        for kind, alert in list(self.alerts.pop_due(current_time_ms)):
+            if kind == CLEANUP:
+                self.alerts.remove(alert.key)
+            else:
+                await self._auto_resolve(alert, timestamp)
+
+        # Alerts seen this tick, plus resolved ones still in their display window
+        current_alerts = [alert.to_dict() for alert in touched.values()]
+        current_alerts.extend(alert.to_dict() for alert in self.alerts.resolved.values() if alert.id not in touched)
 
         # [NEW] Periodic AI Autonomy Check (Global Optimization)
         if (current_time_ms - self.last_autonomy_check) > 10000: # Every 10 Seconds
             self.last_autonomy_check = current_time_ms
             
-            # Build Context
-            pending_orders = len([o for o in data.get("orders", []) if o["status"] != "Ready"])
-            
-            # Simplified Machine States for AI
-            machines_summary = []
-            for line in data.get("lines", []):
-                for m in line.get("machines", []):
-                    machines_summary.append({
-                        "id": m["id"],
-                        "status": m["status"],
-                        "temp": m.get("temperature", 0),
-                        "speed": m.get("speed", 0),
-                        "efficiency": m.get("efficiency", 100),
-                        "wear": max([p.get("wear", 0) for p in m.get("parts", [])], default=0.0)
-                    })
-            
-            context = {
-                "pending_orders": pending_orders,
-                "machines": machines_summary,
-                "cash": data.get("financials", {}).get("cash", 0)
-            }
-            
+            # Build Context: compact per-machine table, fitted to the prompt budget (see prompt_context.py)
+            context = autonomy_context(data)
+
             asyncio.create_task(self._run_autonomy_cycle(context))
 
         # [NEW] Data Cleanup (Every hour check)
-        if (current_time_ms - self.last_cleanup) > 3600000: # 1 Hour
+        cleanup_due = (current_time_ms - self.last_cleanup) > 3600000 # 1 Hour
+        if self.retention.plan: # Interrupted run: resume after a minute instead of an hour
+            cleanup_due = cleanup_due or (current_time_ms - self.last_cleanup) > 60000
+        if cleanup_due:
              self.last_cleanup = current_time_ms
              asyncio.create_task(self.cleanup_old_data())
 
@@ -368,14 +308,64 @@ class DataBridge:
         data['alerts'] = current_alerts
         data['autonomy_enabled'] = self.autonomy_enabled # [NEW] Broadcast state
         self.latest_data = data
+        await self._publish_state()
+
+    async def _auto_resolve(self, alert, timestamp: float):
+        """Alert has been open AUTO_RESOLVE_DELAY_MS with an AI suggestion (or is a machine failure): act on it."""
+        current_time_ms = timestamp * 1000
+        is_critical_failure = alert.is_machine_failure
+        if is_critical_failure and alert.suggested_action is None:
+            action = "emergency reset"
+        else:
+            action = (alert.suggested_action or '').lower()
+
+        machine_id = alert.machine_id
+        logger.info(f"Alert {alert.id} ({alert.severity}) is stale. AI taking action: {action}")
+
+        # [FIX] Only process Ignore if it's NOT a critical failure
+        if "ignore" in action and not is_critical_failure:
+            # [FIX] Explicit Ignore = Resolve without command
+            self.alerts.resolve(alert, current_time_ms, "(Auto-Ignored)")
+            return
+
+        # Map AI response or Alert Type to specific commands
+        command = None
+        if is_critical_failure or "reset" in action or alert.kind == "system_failure":
+            command = "reset"
+        elif "stop" in action or "halt" in action:
+            command = "stop"
+        # Specific Logic based on Metric
+        elif alert.metric.removesuffix(TREND_SUFFIX) in METRIC_COMMANDS:
+            command = METRIC_COMMANDS[alert.metric.removesuffix(TREND_SUFFIX)]
+        elif "speed" in action or "slow" in action:
+            command = "set_speed:1200" # Fallback
+        elif "maintenance" in action:
+            command = "set_speed:1000"
+
+        if command:
+            logger.info(f"Auto-Resolve Executing: {command} for {machine_id}")
+            # Execute
+            await self.send_command({
+                "machine_id": machine_id,
+                "command": command
+            })
+
+            # Update Command History (Lock)
+            self.command_history[machine_id] = timestamp
 
-    async def _run_ai_analysis(self, anomaly: dict, anomaly_key: str, alert_id: str):
+            # Resolved, but kept on screen until its cleanup deadline
+            self.alerts.resolve(alert, current_time_ms, "(Auto-Executed)")
+        else:
+            # Not rescheduled: an unmapped action won't map on the next tick either
+            logger.warning(f"AI suggested '{action}' but no mapping found.")
+
+    async def _run_ai_analysis(self, anomaly: dict, anomaly_key: str, alert_id: str, machine_type: str = None):
         """
         Background task to run AI analysis and update the active alert.
         """
         try:
             logger.info(f"Starting AI analysis for Alert {alert_id}...")
-            ai_response_str = await self.ai.analyze_anomaly(anomaly)
+            ai_response_str = await self.ai.analyze_anomaly(anomaly, machine_type)
             
             # Parse JSON
             try:
@@ -386,10 +376,8 @@ class DataBridge:
                 suggested_action = "Unclear AI response"
                 root_cause = "Parsing Error"
             
-            # Update the active alert in memory
-            if anomaly_key in self.active_alerts:
-                self.active_alerts[anomaly_key]['suggested_action'] = suggested_action
-                self.active_alerts[anomaly_key]['root_cause'] = root_cause
+            # Update the active alert in memory (starts its auto-resolve clock)
+            if self.alerts.attach_analysis(anomaly_key, suggested_action, root_cause, anomaly['severity'].lower()):
                 logger.info(f"AI Analysis complete for {alert_id}: {suggested_action}")
                 
         except Exception as e:
@@ -449,8 +437,28 @@ class DataBridge:
         except Exception as e:
             logger.error(f"Autonomy Cycle Error: {e}")
 
+    async def _publish_state(self):
+        self.state_version += 1
+        async with self.state_changed:
+            self.state_changed.notify_all()
+
+    async def wait_for_state(self, after_version: int, timeout: float = None) -> int:
+        """Block until state_version moves past after_version (or timeout); returns the current version."""
+        async with self.state_changed:
+            try:
+                await asyncio.wait_for(
+                    self.state_changed.wait_for(lambda: self.state_version != after_version), timeout
+                )
+            except asyncio.TimeoutError:
+                pass
+        return self.state_version
+
     def get_latest_data(self):
         return self.latest_data
 
+    def get_latest_payload(self, codec: str = "json"):
+        """latest_data encoded once per state version (str for json, bytes for msgpack)."""
+        return self.payload_cache.get(self.latest_data, self.state_version, codec)
+
     def stop(self):
         self.running = False
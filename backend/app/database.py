@@ -1,5 +1,9 @@
+import asyncio
+import logging
 import os
+from contextlib import asynccontextmanager
 
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 
@@ -17,6 +21,26 @@ AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=F
 
 Base = declarative_base()
 
+logger = logging.getLogger(__name__)
+
+IS_SQLITE = engine.dialect.name == "sqlite"
+
+# Existing SQLite files need a full VACUUM to switch to auto_vacuum=INCREMENTAL; opt-in, run by the retention job
+SQLITE_VACUUM_CONVERT = os.getenv("SQLITE_VACUUM_CONVERT", "").lower() in ("1", "true", "yes")
+vacuum_conversion_pending = False # Set by init_db when the file still needs that VACUUM
+
+# SQLite allows one writer at a time: background writers take turns instead of failing with "database is locked"
+_sqlite_write_lock = asyncio.Lock()
+
+@asynccontextmanager
+async def serialized_write():
+    """Hold around short write transactions from background tasks (no-op on Postgres)."""
+    if IS_SQLITE:
+        async with _sqlite_write_lock:
+            yield
+    else:
+        yield
+
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
@@ -31,3 +55,57 @@ async def init_db():
                 pass
             else:
                 raise e
+
+        # create_all skips existing tables, so indexes added later (e.g. on timestamps) are created here
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                await conn.run_sync(index.create, checkfirst=True)
+
+    if IS_SQLITE:
+        await _enable_incremental_vacuum()
+
+async def _enable_incremental_vacuum():
+    """Let retention cleanup hand freed pages back with PRAGMA incremental_vacuum.
+
+    auto_vacuum can only change through a full VACUUM. That is instant on a new
+    (empty) database, so it is done here; on an existing history file it can
+    block for minutes, so it is only flagged as pending and left to the
+    retention job (see convert_to_incremental_vacuum).
+    """
+    global vacuum_conversion_pending
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        mode = (await conn.execute(text("PRAGMA auto_vacuum"))).scalar()
+        if mode == 2: # 0 = NONE, 1 = FULL, 2 = INCREMENTAL
+            return
+        for table in Base.metadata.sorted_tables:
+            if (await conn.execute(text(f'SELECT 1 FROM "{table.name}" LIMIT 1'))).first() is not None:
+                break
+        else:
+            logger.info("Switching new SQLite database to auto_vacuum=INCREMENTAL")
+            await _vacuum_incremental(conn)
+            return
+
+    vacuum_conversion_pending = True
+    if SQLITE_VACUUM_CONVERT:
+        logger.info("SQLite auto_vacuum=INCREMENTAL conversion pending: runs after the next retention cleanup")
+    else:
+        logger.warning("SQLite database is not in auto_vacuum=INCREMENTAL mode, so space freed by retention "
+                       "stays in the file. Set SQLITE_VACUUM_CONVERT=1 to run the one-time VACUUM after a "
+                       "retention cleanup (writes wait while it runs).")
+
+async def _vacuum_incremental(conn):
+    await conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+    await conn.execute(text("VACUUM"))
+
+async def convert_to_incremental_vacuum():
+    """The one-time VACUUM flagged by init_db. Takes the write lock for its whole (possibly long) run."""
+    global vacuum_conversion_pending
+    logger.info("Switching SQLite database to auto_vacuum=INCREMENTAL (one-time VACUUM)")
+    started = asyncio.get_running_loop().time()
+    async with serialized_write():
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await _vacuum_incremental(conn)
+    vacuum_conversion_pending = False
+    logger.info(f"auto_vacuum=INCREMENTAL conversion done in {asyncio.get_running_loop().time() - started:.1f}s")
@@ -0,0 +1,41 @@
+"""Applies the simulation's delta stream (see simulation/app/delta.py).
+
+Ops are JSON-patch style: {"op": "add" | "remove" | "replace", "path": "/a/0/b", "value": ...},
+with "/-" meaning append to a list.
+"""
+from typing import Any, Dict, List
+
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def apply_patch(doc: Any, ops: List[Dict[str, Any]]) -> Any:
+    """Apply ops in place and return the (possibly replaced) document."""
+    for op in ops:
+        path = op["path"]
+        if path == "":
+            doc = op.get("value") # Whole-document replace
+            continue
+
+        tokens = [_unescape(t) for t in path.split("/")[1:]]
+        parent = doc
+        for token in tokens[:-1]:
+            parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+        last = tokens[-1]
+
+        if isinstance(parent, list):
+            if op["op"] == "add" and last == "-":
+                parent.append(op["value"])
+            elif op["op"] == "add":
+                parent.insert(int(last), op["value"])
+            elif op["op"] == "remove":
+                del parent[int(last)]
+            else:
+                parent[int(last)] = op["value"]
+        else:
+            if op["op"] == "remove":
+                del parent[last]
+            else:
+                parent[last] = op["value"]
+    return doc
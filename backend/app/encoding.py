@@ -0,0 +1,85 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional, Union
+
+# Optional fast encoders
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+try:
+    import msgpack
+    HAS_MSGPACK = True
+except ImportError:
+    HAS_MSGPACK = False
+
+logger = logging.getLogger(__name__)
+
+# Wire formats a client can ask for, in server preference order.
+# "json" is always available (orjson just makes it faster), "msgpack" only if installed.
+SUPPORTED_CODECS = ["json"] + (["msgpack"] if HAS_MSGPACK else [])
+
+
+def encode(data: Any, codec: str = "json") -> Union[str, bytes]:
+    """JSON -> str (websocket text frame), msgpack -> bytes (binary frame)."""
+    if codec == "msgpack" and HAS_MSGPACK:
+        return msgpack.packb(data, use_bin_type=True)
+    if HAS_ORJSON:
+        return orjson.dumps(data).decode("utf-8")
+    return json.dumps(data)
+
+
+def decode(payload: Union[str, bytes]) -> Any:
+    """Inverse of encode(): binary frames are msgpack, text frames JSON."""
+    if isinstance(payload, (bytes, bytearray)):
+        if not HAS_MSGPACK:
+            raise ValueError("Received a msgpack frame but msgpack is not installed")
+        return msgpack.unpackb(payload, raw=False)
+    if HAS_ORJSON:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+def decode_interned(payload: bytes, keys: List[str]) -> Any:
+    """Simulation wire format: msgpack whose map keys may be indexes into `keys`.
+
+    The key table comes from the simulation's "hello" message (see simulation/app/wire.py).
+    """
+    def restore(pairs):
+        return {keys[k] if type(k) is int else k: v for k, v in pairs}
+    return msgpack.unpackb(payload, raw=False, strict_map_key=False, object_pairs_hook=restore)
+
+
+def negotiate(offered: List[str]) -> str:
+    """Pick the client's first offered codec that we support (default json)."""
+    for codec in offered:
+        codec = (codec or "").strip().lower()
+        if codec in SUPPORTED_CODECS:
+            return codec
+    return "json"
+
+
+class PayloadCache:
+    """Encoded bytes of the latest state, one entry per codec.
+
+    Keyed by a version number bumped whenever the state changes, so every
+    client and every repeated push of the same state reuses one encoding.
+    """
+
+    def __init__(self):
+        self.version: Optional[int] = None
+        self._encoded: Dict[str, Union[str, bytes]] = {}
+        self.encodes = 0 # Number of actual encodes (for debugging hit rates)
+
+    def get(self, data: Any, version: int, codec: str = "json") -> Union[str, bytes]:
+        if version != self.version:
+            self.version = version
+            self._encoded = {}
+        payload = self._encoded.get(codec)
+        if payload is None:
+            payload = encode(data, codec)
+            self._encoded[codec] = payload
+            self.encodes += 1
+        return payload
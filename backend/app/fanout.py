@@ -0,0 +1,88 @@
+# Deliberate copy: simulation/app/fanout.py and backend/app/fanout.py are deployed
+# as separate services (each with its own requirements.txt / runtime.txt) and
+# can't import each other. Keep the two files byte-identical: fix both.
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Callable, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+SEND_TIMEOUT = 10.0 # A socket that can't take one frame in this long is treated as dead
+
+
+class Outbox:
+    """Bounded send queue for one websocket, drained by its own task.
+
+    Latest value wins: when the queue is full the oldest frame is dropped, so a
+    slow client skips frames instead of holding up the broadcaster. Frames queued
+    with put_control (handshake / config messages) are never dropped and go out
+    ahead of the state frames. The first failed (or timed out) send marks the
+    outbox dead and calls on_dead once.
+    """
+
+    def __init__(self, websocket, maxsize: int = 2, on_dead: Optional[Callable[["Outbox"], Any]] = None):
+        self.websocket = websocket
+        self.maxsize = max(1, maxsize)
+        self.on_dead = on_dead
+        self.pending: deque = deque()
+        self.control: deque = deque()
+        self.dropped = 0
+        self.sent = 0
+        self.dead = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def full(self) -> bool:
+        return len(self.pending) >= self.maxsize
+
+    def put(self, message: Union[str, bytes], replace: bool = False):
+        """Queue a frame. replace=True discards everything still waiting first."""
+        if self.dead:
+            return
+        if replace:
+            self.dropped += len(self.pending)
+            self.pending.clear()
+        while len(self.pending) >= self.maxsize:
+            self.pending.popleft()
+            self.dropped += 1
+        self.pending.append(message)
+        self._wakeup.set()
+
+    def put_control(self, message: Union[str, bytes]):
+        """Queue a frame that must arrive: not counted against maxsize, not dropped by replace."""
+        if self.dead:
+            return
+        self.control.append(message)
+        self._wakeup.set()
+
+    async def _send(self, message: Union[str, bytes]):
+        if isinstance(message, bytes):
+            await self.websocket.send_bytes(message)
+        else:
+            await self.websocket.send_text(message)
+
+    async def _run(self):
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                while self.control or self.pending:
+                    queue = self.control if self.control else self.pending
+                    await asyncio.wait_for(self._send(queue.popleft()), timeout=SEND_TIMEOUT)
+                    self.sent += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning(f"Dropping client after failed send: {e!r}")
+            self.dead = True
+            self.pending.clear()
+            self.control.clear()
+            if self.on_dead:
+                self.on_dead(self)
+
+    def close(self):
+        self.dead = True
+        self.pending.clear()
+        self.control.clear()
+        self._task.cancel()
@@ -0,0 +1,81 @@
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select
+
+from .database import AsyncSessionLocal
+from .ingest import METRIC_COLUMNS
+from .models import MachineState, MachineStateMinute, MachineStateHour
+
+# name -> (seconds per point, table). Raw rows are one per simulation tick (~1 s).
+RESOLUTIONS = {
+    "raw": (1, MachineState),
+    "1m": (60, MachineStateMinute),
+    "1h": (3600, MachineStateHour),
+}
+
+# How long each tier is kept (seconds), used by cleanup_old_data and to skip tiers already pruned
+RETENTION = {
+    "raw": float(os.getenv("RETENTION_RAW_HOURS", 24)) * 3600,
+    "1m": float(os.getenv("RETENTION_1M_DAYS", 7)) * 86400,
+    "1h": float(os.getenv("RETENTION_1H_DAYS", 30)) * 86400,
+}
+
+
+def pick_resolution(start: float, end: float, points: int, now: Optional[float] = None) -> str:
+    """Finest tier that still holds `start` and returns no more than `points` points."""
+    now = now or datetime.now(timezone.utc).timestamp()
+    for name, (step, _) in RESOLUTIONS.items():
+        if now - start > RETENTION[name] and name != "1h":
+            continue # Already pruned from this tier
+        if (end - start) / step <= points:
+            return name
+    return "1h"
+
+
+def _epoch(dt: datetime) -> float:
+    # SQLite hands back naive datetimes; everything is stored in UTC
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+async def query_history(machine_id: str, metric: str, start: float, end: float,
+                        resolution: str = "auto", points: int = 500) -> Dict[str, Any]:
+    if metric not in METRIC_COLUMNS:
+        raise ValueError(f"Unknown metric '{metric}' (expected one of {', '.join(METRIC_COLUMNS)})")
+    if resolution == "auto":
+        resolution = pick_resolution(start, end, points)
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution '{resolution}' (expected auto, {', '.join(RESOLUTIONS)})")
+
+    _, model = RESOLUTIONS[resolution]
+    start_dt = datetime.fromtimestamp(start, tz=timezone.utc)
+    end_dt = datetime.fromtimestamp(end, tz=timezone.utc)
+    series: List[Dict[str, Any]] = []
+
+    async with AsyncSessionLocal() as session:
+        if resolution == "raw":
+            column = getattr(MachineState, metric)
+            result = await session.execute(
+                select(MachineState.timestamp, column)
+                .where(MachineState.machine_id == machine_id,
+                       MachineState.timestamp >= start_dt, MachineState.timestamp <= end_dt,
+                       column.is_not(None))
+                .order_by(MachineState.timestamp)
+            )
+            for ts, value in result:
+                series.append({"t": _epoch(ts), "avg": value, "min": value, "max": value, "last": value})
+        else:
+            result = await session.execute(
+                select(model.bucket, model.count, model.sum, model.min, model.max, model.last)
+                .where(model.machine_id == machine_id, model.metric == metric,
+                       model.bucket >= start_dt, model.bucket <= end_dt)
+                .order_by(model.bucket)
+            )
+            for bucket, count, total, lo, hi, last in result:
+                series.append({"t": _epoch(bucket), "avg": total / count if count else None,
+                               "min": lo, "max": hi, "last": last})
+
+    return {"machine_id": machine_id, "metric": metric, "resolution": resolution, "points": series}
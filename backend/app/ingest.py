@@ -0,0 +1,301 @@
+import asyncio
+import logging
+import os
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from sqlalchemy import insert, case
+
+from .database import AsyncSessionLocal, engine, serialized_write
+from .models import Event, MachineState, MachineStateMinute, MachineStateHour
+
+logger = logging.getLogger(__name__)
+
+# MachineState metric columns, filled from the machine's "metrics" dict when present
+# (power is a top-level kW reading on each machine, see Machine.power_kw in the simulation)
+METRIC_COLUMNS = ("temperature", "vibration", "speed", "load", "power")
+
+# Rollup bucket size in seconds -> table
+ROLLUP_TABLES = {60: MachineStateMinute, 3600: MachineStateHour}
+
+
+class BatchWriter:
+    """Write-behind queue: rows are buffered in memory and written in bulk by a background task.
+
+    Producers only append, so the websocket receive loop never waits on the
+    database. The task flushes when batch_size rows are waiting or
+    flush_interval seconds have passed, one transaction per batch. The buffer
+    holds at most max_rows; if the database falls that far behind the oldest
+    rows are dropped. Subclasses implement _write(rows).
+    """
+
+    name = "rows"
+
+    def __init__(self, batch_size: int, flush_interval: float, max_rows: int):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.buffer: deque = deque()
+        self.dropped = 0
+        self.written = 0
+        self._overflowing = False # Log once per overflow episode, not every tick
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._closing = False
+        self._flush_lock = asyncio.Lock()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def add(self, row: Dict[str, Any]):
+        self.buffer.append(row)
+        self._trim()
+
+    def _trim(self):
+        overflow = len(self.buffer) - self.max_rows
+        if overflow > 0:
+            for _ in range(overflow):
+                self.buffer.popleft()
+            self.dropped += overflow
+            if not self._overflowing:
+                self._overflowing = True
+                logger.warning(f"{self.name} buffer full ({self.max_rows} rows), dropping oldest")
+        if len(self.buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def clear(self):
+        self.buffer.clear()
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        async with self._flush_lock:
+            while self.buffer:
+                rows = [self.buffer.popleft() for _ in range(min(len(self.buffer), self.batch_size))]
+                try:
+                    async with serialized_write():
+                        await self._write(rows)
+                    self.written += len(rows)
+                    self._overflowing = False
+                except Exception as e:
+                    # Put the batch back (newest rows first if there's no room for all) and retry on the next trigger
+                    logger.error(f"{self.name} flush failed ({len(rows)} rows): {e}")
+                    room = max(0, self.max_rows - len(self.buffer))
+                    keep = rows[len(rows) - room:] if room < len(rows) else rows
+                    self.dropped += len(rows) - len(keep)
+                    self.buffer.extendleft(reversed(keep))
+                    return
+
+    async def _write(self, rows: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    async def close(self):
+        """Stop the background task and write whatever is still buffered."""
+        if self._task:
+            # Let the task finish its current batch rather than cancelling it mid-write
+            self._closing = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+            self._closing = False
+        await self.flush()
+
+
+class MachineStateWriter(BatchWriter):
+    """Per-tick machine snapshots -> machine_states (COPY on Postgres, executemany elsewhere).
+
+    Every snapshot is also fed to `rollups` (if given) so the 1m / 1h tables stay current.
+    """
+
+    name = "machine_states"
+
+    def __init__(self, batch_size: int = None, flush_interval: float = None, max_rows: int = None,
+                 rollups: "RollupWriter" = None):
+        super().__init__(
+            batch_size or int(os.getenv("STATE_BATCH_SIZE", 500)),
+            flush_interval or float(os.getenv("STATE_FLUSH_INTERVAL", 5.0)),
+            max_rows or int(os.getenv("STATE_BUFFER_MAX", 50000)),
+        )
+        self.rollups = rollups
+
+    def add_snapshot(self, data: Dict[str, Any]):
+        """Queue one row per machine from a simulation state dict."""
+        ts = data.get("timestamp") or datetime.now(timezone.utc).timestamp()
+        stamp = datetime.fromtimestamp(ts, tz=timezone.utc)
+        rows = []
+        for line in data.get("lines", []):
+            for machine in line.get("machines", []):
+                metrics = machine.get("metrics", {})
+                row = {"timestamp": stamp, "machine_id": machine["id"], "status": machine.get("status")}
+                for column in METRIC_COLUMNS:
+                    value = metrics.get(column, machine.get(column))
+                    row[column] = float(value) if value is not None else None
+                rows.append(row)
+        self.buffer.extend(rows)
+        self._trim()
+        if self.rollups is not None:
+            self.rollups.add_rows(ts, rows)
+
+    async def _write(self, rows: List[Dict[str, Any]]):
+        if engine.dialect.name == "postgresql":
+            # asyncpg COPY: far cheaper than row inserts for large batches
+            columns = ["timestamp", "machine_id", "status", *METRIC_COLUMNS]
+            async with engine.begin() as conn:
+                raw = await conn.get_raw_connection()
+                await raw.driver_connection.copy_records_to_table(
+                    MachineState.__tablename__,
+                    records=[tuple(row[c] for c in columns) for row in rows],
+                    columns=columns,
+                )
+            return
+        async with AsyncSessionLocal() as session:
+            await session.execute(insert(MachineState), rows) # executemany, single transaction
+            await session.commit()
+
+
+class EventWriter(BatchWriter):
+    """Anomaly events -> events table, committed in batches instead of once per tick."""
+
+    name = "events"
+
+    def __init__(self, batch_size: int = None, flush_interval: float = None, max_rows: int = None):
+        super().__init__(
+            batch_size or int(os.getenv("EVENT_BATCH_SIZE", 100)),
+            flush_interval or float(os.getenv("EVENT_FLUSH_INTERVAL", 1.0)),
+            max_rows or int(os.getenv("EVENT_BUFFER_MAX", 10000)),
+        )
+
+    def add_event(self, anomaly: Dict[str, Any]):
+        self.add({
+            # Stamped now: the row is written later, so the column default would be late
+            "timestamp": datetime.now(timezone.utc),
+            "machine_id": anomaly["machine_id"],
+            "type": anomaly["type"],
+            "severity": anomaly["severity"],
+            "message": anomaly["message"],
+            "details": anomaly.get("details", ""),
+        })
+
+    async def _write(self, rows: List[Dict[str, Any]]):
+        async with AsyncSessionLocal() as session:
+            await session.execute(insert(Event), rows)
+            await session.commit()
+
+
+class RollupWriter(BatchWriter):
+    """1-minute and 1-hour count/sum/min/max/last per machine and metric.
+
+    Open buckets are aggregated in memory from the snapshot stream. A bucket is
+    queued once the stream moves past it (or at shutdown) and upserted, so a
+    partial bucket written on shutdown is merged with the rest after a restart.
+    """
+
+    name = "rollups"
+
+    def __init__(self, batch_size: int = None, flush_interval: float = None, max_rows: int = None):
+        super().__init__(
+            batch_size or int(os.getenv("ROLLUP_BATCH_SIZE", 500)),
+            flush_interval or float(os.getenv("ROLLUP_FLUSH_INTERVAL", 10.0)),
+            max_rows or int(os.getenv("ROLLUP_BUFFER_MAX", 20000)),
+        )
+        # bucket seconds -> {(machine_id, metric): [count, sum, min, max, last]}
+        self.open: Dict[int, Dict[tuple, list]] = {res: {} for res in ROLLUP_TABLES}
+        self.open_start: Dict[int, Any] = {res: None for res in ROLLUP_TABLES}
+
+    def add_rows(self, ts: float, rows: List[Dict[str, Any]]):
+        for res, buckets in self.open.items():
+            start = ts - ts % res
+            if self.open_start[res] is not None and start != self.open_start[res]:
+                self._close_bucket(res)
+                buckets = self.open[res]
+            self.open_start[res] = start
+            for row in rows:
+                for metric in METRIC_COLUMNS:
+                    value = row[metric]
+                    if value is None:
+                        continue
+                    agg = buckets.get((row["machine_id"], metric))
+                    if agg is None:
+                        buckets[(row["machine_id"], metric)] = [1, value, value, value, value]
+                    else:
+                        agg[0] += 1
+                        agg[1] += value
+                        if value < agg[2]:
+                            agg[2] = value
+                        if value > agg[3]:
+                            agg[3] = value
+                        agg[4] = value
+        self._trim()
+
+    def _close_bucket(self, res: int):
+        bucket = datetime.fromtimestamp(self.open_start[res], tz=timezone.utc)
+        for (machine_id, metric), (count, total, lo, hi, last) in self.open[res].items():
+            self.buffer.append({
+                "resolution": res, "bucket": bucket, "machine_id": machine_id, "metric": metric,
+                "count": count, "sum": total, "min": lo, "max": hi, "last": last,
+            })
+        self.open[res] = {}
+        self.open_start[res] = None
+
+    def clear(self):
+        super().clear()
+        self.open = {res: {} for res in ROLLUP_TABLES}
+        self.open_start = {res: None for res in ROLLUP_TABLES}
+
+    async def _write(self, rows: List[Dict[str, Any]]):
+        # Merge rows for the same bucket first: one upsert statement can't touch a row twice
+        merged: Dict[tuple, Dict[str, Any]] = {}
+        for row in rows:
+            key = (row["resolution"], row["machine_id"], row["metric"], row["bucket"])
+            prev = merged.get(key)
+            if prev is None:
+                merged[key] = dict(row)
+            else:
+                prev["count"] += row["count"]
+                prev["sum"] += row["sum"]
+                prev["min"] = min(prev["min"], row["min"])
+                prev["max"] = max(prev["max"], row["max"])
+                prev["last"] = row["last"]
+
+        if engine.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as upsert
+
+        async with AsyncSessionLocal() as session:
+            for res, model in ROLLUP_TABLES.items():
+                batch = [{k: v for k, v in row.items() if k != "resolution"}
+                         for row in merged.values() if row["resolution"] == res]
+                if not batch:
+                    continue
+                table = model.__table__
+                stmt = upsert(table)
+                new, old = stmt.excluded, table.c
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["machine_id", "metric", "bucket"],
+                    set_={
+                        "count": old["count"] + new["count"],
+                        "sum": old["sum"] + new["sum"],
+                        "min": case((new["min"] < old["min"], new["min"]), else_=old["min"]),
+                        "max": case((new["max"] > old["max"], new["max"]), else_=old["max"]),
+                        "last": new["last"],
+                    },
+                )
+                await session.execute(stmt, batch)
+            await session.commit()
+
+    async def close(self):
+        # Partial buckets too; the upsert merges them if the stream resumes in the same bucket
+        for res in ROLLUP_TABLES:
+            if self.open_start[res] is not None:
+                self._close_bucket(res)
+        await super().close()
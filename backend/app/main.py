@@ -1,10 +1,14 @@
 import asyncio
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Response, Query, HTTPException
 from contextlib import asynccontextmanager
 from .database import init_db
 from .bridge import DataBridge
+from .encoding import negotiate
+from .fanout import Outbox
+from .history import query_history
 import logging
 import json
+import time
 from dotenv import load_dotenv
 import os
 import os
@@ -35,6 +39,10 @@ async def lifespan(app: FastAPI):
     data_bridge.stop()
     await bridge_task
     push_task.cancel()
+    # Write out buffered rows
+    await data_bridge.state_writer.close()
+    await data_bridge.event_writer.close()
+    await data_bridge.rollup_writer.close()
 
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -84,26 +92,104 @@ async def set_autonomy(request: AutonomyRequest):
 
 @app.get("/api/v1/latest")
 async def get_latest_data():
-    return data_bridge.get_latest_data()
+    # Same cached JSON the websocket push uses, no re-serialization per request
+    return Response(content=data_bridge.get_latest_payload("json"), media_type="application/json")
 
 # WebSocket for Frontend
 class ConnectionManager:
-    def __init__(self):
+    """Fan-out hub: every connection gets a bounded latest-wins Outbox (see fanout.py).
+
+    Broadcasting only queues frames, so one stalled browser can't delay the others;
+    sockets whose sends fail or stall are evicted. Each state version goes to a client
+    at most once; clients may cap their rate with ?max_hz= (e.g. 1 for mobile), in which
+    case they get the newest state when their window opens.
+    """
+    def __init__(self, queue_size: int = None):
         self.active_connections: list[WebSocket] = []
+        self.codecs: dict = {} # websocket -> "json" | "msgpack"
+        self.outboxes: dict = {} # websocket -> Outbox
+        self.min_intervals: dict = {} # websocket -> seconds between pushes (rate-capped clients only)
+        self.last_push: dict = {} # websocket -> monotonic time of the last push
+        self.sent_versions: dict = {} # websocket -> last state_version queued
+        self.deferred: dict = {} # websocket -> pending call_later handle for a capped client
+        self.queue_size = queue_size or int(os.getenv("FRONTEND_CLIENT_QUEUE", 2))
 
     async def connect(self, websocket: WebSocket):
-        await websocket.accept()
+        # Content negotiation: Sec-WebSocket-Protocol ("msgpack", "json") or ?encoding=msgpack
+        offered = [p.strip().lower() for p in websocket.headers.get("sec-websocket-protocol", "").split(",") if p.strip()]
+        codec = negotiate(offered + [websocket.query_params.get("encoding", "")])
+        # Only echo a subprotocol the client actually offered
+        await websocket.accept(subprotocol=codec if codec in offered else None)
         self.active_connections.append(websocket)
+        self.codecs[websocket] = codec
+        self.outboxes[websocket] = Outbox(websocket, maxsize=self.queue_size, on_dead=self._evict)
+        try:
+            max_hz = float(websocket.query_params.get("max_hz", 0))
+        except ValueError:
+            max_hz = 0
+        if max_hz > 0:
+            self.min_intervals[websocket] = 1.0 / max_hz
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        if websocket in self.active_connections:
+            self.active_connections.remove(websocket)
+        self.codecs.pop(websocket, None)
+        self.min_intervals.pop(websocket, None)
+        self.last_push.pop(websocket, None)
+        self.sent_versions.pop(websocket, None)
+        timer = self.deferred.pop(websocket, None)
+        if timer:
+            timer.cancel()
+        outbox = self.outboxes.pop(websocket, None)
+        if outbox:
+            outbox.close()
+
+    def _evict(self, outbox: Outbox):
+        websocket = outbox.websocket
+        self.disconnect(websocket)
+        logger.warning(f"Evicted unresponsive frontend client ({outbox.sent} sent, {outbox.dropped} dropped)")
+        asyncio.create_task(self._close_quietly(websocket))
+
+    @staticmethod
+    async def _close_quietly(websocket: WebSocket):
+        try:
+            await websocket.close()
+        except Exception:
+            pass
 
     async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except Exception as e:
-                logger.error(f"Error broadcasting to client: {e}")
+        for outbox in list(self.outboxes.values()):
+            outbox.put(message)
+
+    async def broadcast_state(self, bridge: DataBridge):
+        """Push the bridge's latest state, encoded once per version and codec."""
+        now = time.monotonic()
+        for connection in list(self.outboxes):
+            self.push_state(connection, bridge, now)
+
+    def push_state(self, websocket: WebSocket, bridge: DataBridge, now: float = None):
+        outbox = self.outboxes.get(websocket)
+        version = bridge.state_version
+        if outbox is None or self.sent_versions.get(websocket) == version:
+            return
+        now = now or time.monotonic()
+        interval = self.min_intervals.get(websocket)
+        if interval:
+            wait = self.last_push.get(websocket, 0) + interval - now
+            if wait > 0:
+                # Over the cap: send whatever is newest once the window opens
+                if websocket not in self.deferred:
+                    self.deferred[websocket] = asyncio.get_running_loop().call_later(
+                        wait, self._push_deferred, websocket, bridge)
+                return
+        self.last_push[websocket] = now
+        self.sent_versions[websocket] = version
+        outbox.put(bridge.get_latest_payload(self.codecs.get(websocket, "json")))
+
+    def _push_deferred(self, websocket: WebSocket, bridge: DataBridge):
+        self.deferred.pop(websocket, None)
+        if bridge.latest_data:
+            self.push_state(websocket, bridge)
 
 manager = ConnectionManager()
 
@@ -111,6 +197,8 @@ manager = ConnectionManager()
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     logger.info("Frontend connected to WebSocket")
+    if data_bridge.latest_data:
+        manager.push_state(websocket, data_bridge) # Current state right away, not on the next tick
     try:
         while True:
             # Keep connection alive
@@ -126,21 +214,21 @@ async def websocket_endpoint(websocket: WebSocket):
 
 async def push_to_frontend():
     logger.info("Push task started")
+    version = data_bridge.state_version
     while True:
         try:
+            # Woken by the bridge as soon as process_data publishes a new state (no polling)
+            version = await data_bridge.wait_for_state(version)
             if data_bridge.latest_data:
-                await manager.broadcast(json.dumps(data_bridge.latest_data))
-            else:
-                pass
+                await manager.broadcast_state(data_bridge)
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             logger.error(f"Push task error: {e}")
-        
-        await asyncio.sleep(0.5) # Update frontend every 500ms
-
-# AI Module
-from .ai import AICollaborator
+            await asyncio.sleep(0.5)
 
-ai_agent = AICollaborator()
+# AI Module: the bridge's collaborator, so chat shares its scheduler (and analysis cache)
+ai_agent = data_bridge.ai
 
 class ChatRequest(BaseModel):
     message: str
@@ -197,6 +285,37 @@ async def control_machine(machine_id: str, request: ControlRequest):
     else:
         return {"status": "error", "message": "Failed to send command (Simulation disconnected?)"}
 
+@app.get("/api/v1/ai/cache")
+async def ai_cache_stats():
+    return data_bridge.ai.analysis_cache.stats()
+
+@app.get("/api/v1/ai/scheduler")
+async def ai_scheduler_stats():
+    return data_bridge.ai.scheduler.stats()
+
+@app.get("/api/v1/alerts")
+async def list_alerts(machine_id: str = None, severity: str = None, include_resolved: bool = True):
+    alerts = data_bridge.alerts.query(machine_id, severity)
+    return [alert.to_dict() for alert in alerts if include_resolved or not alert.resolved]
+
+@app.get("/api/v1/machines/{machine_id}/history")
+async def machine_history(
+    machine_id: str,
+    metric: str = "temperature",
+    start: float = Query(None, alias="from"), # Epoch seconds, default: 1 hour ago
+    end: float = Query(None, alias="to"), # Epoch seconds, default: now
+    resolution: str = "auto", # auto | raw | 1m | 1h
+    points: int = Query(500, ge=1, le=10000), # Point budget used by resolution=auto
+):
+    end = end or time.time()
+    start = start or end - 3600
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    try:
+        return await query_history(machine_id, metric, start, end, resolution, points)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # Add push task to startup
 
 if __name__ == "__main__":
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, UniqueConstraint
 from sqlalchemy.sql import func
 from .database import Base
 
@@ -6,7 +6,7 @@ class Event(Base):
     __tablename__ = "events"
 
     id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True) # Retention range deletes
     machine_id = Column(String, index=True)
     type = Column(String) # ANOMALY, ALERT, INFO
     severity = Column(String) # LOW, MEDIUM, HIGH, CRITICAL
@@ -17,7 +17,7 @@ class MachineState(Base):
     __tablename__ = "machine_states"
 
     id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True) # Retention range deletes
     machine_id = Column(String, index=True)
     status = Column(String)
     # Store key metrics as generic columns or specific ones
@@ -26,3 +26,24 @@ class MachineState(Base):
     speed = Column(Float, nullable=True)
     load = Column(Float, nullable=True)
     power = Column(Float, nullable=True)
+
+# Downsampled machine_states, maintained by ingest.RollupWriter.
+# One row per machine / metric / bucket; avg = sum / count.
+class RollupMixin:
+    id = Column(Integer, primary_key=True)
+    bucket = Column(DateTime(timezone=True), nullable=False, index=True) # Bucket start (UTC)
+    machine_id = Column(String, nullable=False)
+    metric = Column(String, nullable=False)
+    count = Column(Integer, nullable=False)
+    sum = Column(Float, nullable=False)
+    min = Column(Float, nullable=False)
+    max = Column(Float, nullable=False)
+    last = Column(Float, nullable=False)
+
+class MachineStateMinute(RollupMixin, Base):
+    __tablename__ = "machine_states_1m"
+    __table_args__ = (UniqueConstraint("machine_id", "metric", "bucket", name="uq_machine_states_1m"),)
+
+class MachineStateHour(RollupMixin, Base):
+    __tablename__ = "machine_states_1h"
+    __table_args__ = (UniqueConstraint("machine_id", "metric", "bucket", name="uq_machine_states_1h"),)
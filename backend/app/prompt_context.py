@@ -0,0 +1,189 @@
+import json
+import math
+import os
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+# Rough prompt budget for the factory context (tokens ~= chars / 4 for this kind of JSON)
+CONTEXT_TOKENS = int(os.getenv("AI_CONTEXT_TOKENS", 1200))
+CHARS_PER_TOKEN = 4
+TOP_ORDERS = int(os.getenv("AI_CONTEXT_ORDERS", 5))
+
+# Statuses that are normal operation; anything else (ERROR, MAINTENANCE, repair states) is reported in full
+NORMAL_STATUSES = {"RUNNING", "IDLE", "STARVED", "BLOCKED"}
+SEVERITY_RANK = {"critical": 0, "high": 1, "warning": 2, "medium": 3, "low": 4}
+MACHINE_ID = re.compile(r"\bL\d+-[A-Z]+-\d+\b", re.IGNORECASE)
+
+
+def compact_json(obj: Any) -> str:
+    """No indentation, no spaces after separators, non-ASCII kept as-is (fewer tokens than \\u escapes)."""
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _round(value: Any, digits: int = 2) -> Any:
+    return round(value, digits) if isinstance(value, float) else value
+
+
+def _due_key(order: Dict[str, Any]) -> float:
+    # Seed orders carry ISO dates, generated ones epoch seconds
+    due = order.get("due")
+    if isinstance(due, (int, float)):
+        return float(due)
+    try:
+        return datetime.fromisoformat(due).replace(tzinfo=timezone.utc).timestamp()
+    except (TypeError, ValueError):
+        return math.inf
+
+
+def _is_abnormal(machine: Dict[str, Any], alerted: set) -> bool:
+    return (machine.get("status") not in NORMAL_STATUSES
+            or machine["id"] in alerted
+            or (machine.get("wear_level") or 0) > 0.8)
+
+
+def _machine_detail(machine: Dict[str, Any]) -> Dict[str, Any]:
+    detail = {
+        "id": machine["id"],
+        "type": machine.get("type"),
+        "status": machine.get("status"),
+        "health": machine.get("health_score"),
+        "metrics": {k: _round(v) for k, v in machine.get("metrics", {}).items()},
+        "parts": {p["name"]: p.get("wear") for p in machine.get("parts", [])},
+    }
+    if machine.get("last_fault") not in (None, "None"):
+        detail["last_fault"] = machine["last_fault"]
+    return detail
+
+
+def _line_summary(line: Dict[str, Any], healthy: List[Dict[str, Any]]) -> Dict[str, Any]:
+    status: Dict[str, int] = {}
+    for m in healthy:
+        status[m.get("status")] = status.get(m.get("status"), 0) + 1
+    temps = [m["temperature"] for m in healthy if m.get("temperature") is not None]
+    summary = {
+        "line": line.get("id"),
+        "product": line.get("product_type"),
+        "ok": [m["id"] for m in healthy],
+        "status": status,
+        "min_health": min((m.get("health_score", 100) for m in healthy), default=None),
+        "max_wear": _round(max((m.get("wear_level") or 0 for m in healthy), default=0.0), 3),
+    }
+    if temps:
+        summary["max_temp"] = _round(max(temps), 1)
+    order = line.get("current_order")
+    if order:
+        summary["order"] = {"id": order.get("id"), "progress": order.get("progress")}
+    return summary
+
+
+def _trim(items: List[Any], excess: int) -> int:
+    """Pop items off the end until about `excess` characters are gone; returns how many were dropped."""
+    dropped = 0
+    while items and excess > 0:
+        excess -= len(compact_json(items.pop())) + 1 # + the comma
+        dropped += 1
+    return dropped
+
+
+def _fit(context: Dict[str, Any], trim_order: Iterable[str], budget_tokens: Optional[int]) -> Dict[str, Any]:
+    """Drop list items from the end of the least important sections until the JSON fits the budget."""
+    budget = (budget_tokens or CONTEXT_TOKENS) * CHARS_PER_TOKEN
+    omitted: Dict[str, int] = {}
+    for section in trim_order:
+        excess = len(compact_json(context)) - budget
+        if excess <= 0:
+            break
+        dropped = _trim(context.get(section) or [], excess)
+        if dropped:
+            omitted[section] = dropped
+    if omitted:
+        context["omitted"] = omitted # Tell the model the lists are partial
+    return context
+
+
+def chat_context(data: Dict[str, Any], message: str = "", budget_tokens: Optional[int] = None) -> Dict[str, Any]:
+    """Token-budgeted view of a factory state for chat.
+
+    Machines that are broken, alerted, worn or mentioned in the message are
+    listed in full; the rest are folded into one summary per line. Orders are
+    the next TOP_ORDERS open ones by due date, inventory only what is low.
+    """
+    alerts = [a for a in data.get("alerts", []) if not a.get("resolved")]
+    alerts.sort(key=lambda a: SEVERITY_RANK.get(a.get("severity"), 9))
+    alerted = {a.get("machineId") for a in alerts}
+    focus = {m.upper() for m in MACHINE_ID.findall(message or "")}
+
+    machines, lines = [], []
+    total, running = 0, 0
+    for line in data.get("lines", []):
+        healthy = []
+        for m in line.get("machines", []):
+            total += 1
+            running += m.get("status") == "RUNNING"
+            if m["id"] in focus or _is_abnormal(m, alerted):
+                machines.append(_machine_detail(m))
+            else:
+                healthy.append(m)
+        if healthy:
+            lines.append(_line_summary(line, healthy))
+    # Focused machines first, then the worst ones, so trimming drops the least relevant
+    machines.sort(key=lambda m: (m["id"] not in focus, m["status"] in NORMAL_STATUSES, m["health"] or 0))
+
+    open_orders = [o for o in data.get("orders", []) if o.get("status") != "Ready"]
+    open_orders.sort(key=_due_key)
+    kpi = data.get("kpi", {})
+    window = kpi.get("windows", {}).get("15m", {})
+
+    context = {
+        "summary": {
+            "machines": total,
+            "running": running,
+            "abnormal": len(machines),
+            "open_orders": len(open_orders),
+            "active_alerts": len(alerts),
+            "autonomy": data.get("autonomy_enabled"),
+        },
+        "financials": {k: _round(v) for k, v in data.get("financials", {}).items()},
+        "kpi": {"output": kpi.get("total_output"), "defect_rate": kpi.get("defect_rate"),
+                "oee_15m": window.get("oee")},
+        "machines": machines,
+        "lines": lines,
+        "workers": [{k: w.get(k) for k in ("id", "state", "location", "target")} for w in data.get("workers", [])],
+        "alerts": [{"machine": a.get("machineId"), "severity": a.get("severity"), "message": a.get("message"),
+                    "suggested": a.get("suggested_action")} for a in alerts],
+        "orders": [{"id": o.get("id"), "product": o.get("product"), "qty": o.get("quantity"),
+                    "progress": o.get("progress"), "status": o.get("status"), "due": o.get("due")}
+                   for o in open_orders[:TOP_ORDERS]],
+        "low_stock": [{"id": i.get("id"), "qty": i.get("quantity"), "reorder_at": i.get("reorder_point")}
+                      for i in data.get("inventory", [])
+                      if i.get("status") not in (None, "OK") or i.get("quantity", 0) <= i.get("reorder_point", -1)],
+    }
+    return _fit(context, ("low_stock", "orders", "alerts", "lines", "machines"), budget_tokens)
+
+
+def autonomy_context(data: Dict[str, Any], budget_tokens: Optional[int] = None) -> Dict[str, Any]:
+    """Per-machine table for the autonomy loop (it needs ids to act on), abnormal machines first."""
+    cols = ["id", "status", "temp", "speed", "efficiency", "wear"]
+    rows = []
+    for line in data.get("lines", []):
+        for m in line.get("machines", []):
+            rows.append([
+                m["id"],
+                m["status"],
+                _round(m.get("temperature") or 0, 1), # Sort key below: None would break the negation
+                _round(m.get("speed") or 0, 1),
+                _round(m.get("efficiency", 100), 1),
+                _round(max([p.get("wear", 0) for p in m.get("parts", [])], default=0.0), 3),
+            ])
+    rows.sort(key=lambda r: (r[1] in NORMAL_STATUSES, -r[2])) # Broken, then hottest
+    context = {
+        "pending_orders": len([o for o in data.get("orders", []) if o["status"] != "Ready"]),
+        "cash": data.get("financials", {}).get("cash", 0),
+        "machines": {"cols": cols, "rows": rows},
+    }
+    budget = (budget_tokens or CONTEXT_TOKENS) * CHARS_PER_TOKEN
+    omitted = _trim(rows, len(compact_json(context)) - budget)
+    if omitted:
+        context["omitted_machines"] = omitted
+    return context
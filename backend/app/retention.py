@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+from sqlalchemy import delete, select
+
+from . import database
+from .database import AsyncSessionLocal, engine, IS_SQLITE, SQLITE_VACUUM_CONVERT, serialized_write
+from .history import RETENTION
+from .models import Event, MachineState, MachineStateMinute, MachineStateHour
+
+logger = logging.getLogger(__name__)
+
+EVENT_RETENTION = float(os.getenv("RETENTION_EVENTS_DAYS", 30)) * 86400
+
+
+class RetentionJob:
+    """Deletes expired rows in bounded chunks, one short transaction per chunk.
+
+    Each chunk deletes at most batch_size rows (by id, found through the
+    timestamp index) and the loop sleeps between chunks, so ingestion and the
+    websocket loop keep running; on SQLite the write lock is only held for one
+    chunk at a time. The plan (table + cutoff) survives a failed or cancelled
+    run and the next run() resumes it instead of starting over. On SQLite the
+    freed pages are returned with PRAGMA incremental_vacuum afterwards (or, with
+    SQLITE_VACUUM_CONVERT=1, an existing database gets its one-time VACUUM to
+    auto_vacuum=INCREMENTAL at that point).
+    """
+
+    def __init__(self, batch_size: int = None, pause: float = None):
+        self.batch_size = batch_size or int(os.getenv("RETENTION_BATCH_SIZE", 5000))
+        self.pause = pause if pause is not None else float(os.getenv("RETENTION_PAUSE", 0.05))
+        self.plan: List[Tuple[type, str, datetime]] = [] # Tables still to prune: (model, column, cutoff)
+        self.deleted: Dict[str, int] = {}
+        self._running = asyncio.Lock()
+
+    def _make_plan(self) -> List[Tuple[type, str, datetime]]:
+        now = datetime.now(timezone.utc)
+        return [
+            (Event, "timestamp", now - timedelta(seconds=EVENT_RETENTION)),
+            (MachineState, "timestamp", now - timedelta(seconds=RETENTION["raw"])),
+            (MachineStateMinute, "bucket", now - timedelta(seconds=RETENTION["1m"])),
+            (MachineStateHour, "bucket", now - timedelta(seconds=RETENTION["1h"])),
+        ]
+
+    async def run(self) -> Dict[str, int]:
+        if self._running.locked():
+            logger.info("Retention cleanup already running, skipping")
+            return self.deleted
+        async with self._running:
+            if not self.plan:
+                self.plan = self._make_plan()
+                self.deleted = {}
+            else:
+                logger.info(f"Resuming retention cleanup ({len(self.plan)} tables left)")
+
+            while self.plan:
+                model, column, cutoff = self.plan[0]
+                table = model.__tablename__
+                while True:
+                    count = await self._delete_chunk(model, column, cutoff)
+                    self.deleted[table] = self.deleted.get(table, 0) + count
+                    if count < self.batch_size:
+                        break
+                    await asyncio.sleep(self.pause)
+                self.plan.pop(0)
+
+            if IS_SQLITE:
+                if database.vacuum_conversion_pending and SQLITE_VACUUM_CONVERT:
+                    # Opt-in one-time conversion, right after the deletes so there is the least left to copy
+                    await database.convert_to_incremental_vacuum()
+                else:
+                    await self._incremental_vacuum()
+            return self.deleted
+
+    async def _delete_chunk(self, model, column: str, cutoff: datetime) -> int:
+        expired = select(model.id).where(getattr(model, column) < cutoff).limit(self.batch_size)
+        async with serialized_write():
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    delete(model).where(model.id.in_(expired)).execution_options(synchronize_session=False))
+                await session.commit()
+        return result.rowcount or 0
+
+    async def _incremental_vacuum(self, pages: int = 2000):
+        # Free pages go back to the OS a slice at a time (no-op unless auto_vacuum=INCREMENTAL, see init_db).
+        # executescript: sqlite3's execute() only steps the pragma once, i.e. frees a single page
+        while True:
+            async with serialized_write():
+                async with engine.connect() as conn:
+                    raw = await conn.get_raw_connection()
+                    db = raw.driver_connection
+                    async with db.execute("PRAGMA freelist_count") as cursor:
+                        free = (await cursor.fetchone())[0]
+                    if free:
+                        await db.executescript(f"PRAGMA incremental_vacuum({pages});")
+            if free <= pages:
+                return
+            await asyncio.sleep(self.pause)
@@ -0,0 +1,26 @@
+import time
+
+
+class WallClock:
+    """Real time source. Used by the live websocket simulation loop."""
+
+    def now(self) -> float:
+        return time.time()
+
+
+class SimulatedClock:
+    """Manually advanced clock for headless / fast-forward runs.
+
+    Factory reads `now()` for order due dates, worker timers and the
+    7-day reset, so driving it with this clock decouples factory time
+    from wall-clock time.
+    """
+
+    def __init__(self, start: float = 0.0):
+        self._now = float(start)
+
+    def now(self) -> float:
+        return self._now
+
+    def advance(self, dt: float):
+        self._now += dt
@@ -61,3 +61,55 @@ RECIPES = {
 
 # Packaging Recipe (Consumed at Packer)
 PACKING_REQUIREMENT = {"PACKAGING": 1}
+
+# Per-Factory Configuration
+# The constants above are the defaults. A Factory carries its own SimConfig so
+# scenario sweeps can override values per replica without touching module globals.
+import copy
+from dataclasses import dataclass, field, fields
+from typing import Dict, Any, Optional
+
+@dataclass
+class SimConfig:
+    update_interval: float = UPDATE_INTERVAL
+    line_count: int = 3 # Production lines (beyond A/B/C, products repeat in the same order)
+
+    # Workers
+    worker_count: int = WORKER_COUNT
+    worker_speed_base: float = WORKER_SPEED_BASE
+    travel_noise_mean: float = TRAVEL_NOISE_MEAN
+    travel_noise_std: float = TRAVEL_NOISE_STD
+    repair_time_base: float = REPAIR_TIME_BASE
+
+    # Machine Physics
+    threshold_variance: float = THRESHOLD_VARIANCE
+    failure_chance_base: float = FAILURE_CHANCE_BASE
+    failure_exponent: float = FAILURE_EXPONENT
+    cutter_speed_setting: float = 1500.0 # Default Cutter RPM when no speed_setting was commanded
+    base_thresholds: Dict[str, Dict[str, Dict[str, float]]] = field(default_factory=lambda: copy.deepcopy(base_thresholds))
+
+    # Economy
+    product_price: float = PRODUCT_PRICE
+    worker_hourly_wage: float = WORKER_HOURLY_WAGE
+    repair_cost: float = REPAIR_COST
+    energy_cost_per_kwh: float = ENERGY_COST_PER_KWH
+    initial_capital: float = INITIAL_CAPITAL
+
+    # Inventory & Recipes
+    materials_db: Dict[str, Dict[str, Any]] = field(default_factory=lambda: copy.deepcopy(MATERIALS_DB))
+    recipes: Dict[str, Dict[str, int]] = field(default_factory=lambda: copy.deepcopy(RECIPES))
+    packing_requirement: Dict[str, int] = field(default_factory=lambda: copy.deepcopy(PACKING_REQUIREMENT))
+    order_mix: Optional[Dict[str, float]] = None # Product -> weight for new orders (None = uniform)
+
+    @classmethod
+    def from_overrides(cls, overrides: Optional[Dict[str, Any]] = None) -> "SimConfig":
+        """Build a config from {name: value}. Names match fields case-insensitively,
+        so both "failure_exponent" and "FAILURE_EXPONENT" work."""
+        known = {f.name for f in fields(cls)}
+        kwargs = {}
+        for key, value in (overrides or {}).items():
+            name = key.lower()
+            if name not in known:
+                raise KeyError(f"Unknown simulation setting: {key}")
+            kwargs[name] = copy.deepcopy(value)
+        return cls(**kwargs)
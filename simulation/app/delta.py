@@ -0,0 +1,49 @@
+"""JSON-patch style deltas between consecutive factory snapshots.
+
+Ops follow RFC 6902 naming ("add" / "remove" / "replace", "/"-separated
+paths with ~0 / ~1 escaping). Lists are diffed by index: a common prefix
+is recursed into, extra new items are appended with "/-", and surplus old
+items are removed from the end. That fits the snapshot shape, where lists
+(lines, machines, parts, orders) mostly keep their order and grow at the end.
+
+This side only produces patches; apply_patch lives with its one consumer, the
+backend bridge (backend/app/delta.py).
+"""
+from typing import Any, Dict, List
+
+
+def _escape(key: Any) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def make_patch(old: Any, new: Any, path: str = "") -> List[Dict[str, Any]]:
+    """Ops that turn `old` into `new`. `old` is never modified."""
+    ops: List[Dict[str, Any]] = []
+    _diff(old, new, path, ops)
+    return ops
+
+
+def _diff(old: Any, new: Any, path: str, ops: List[Dict[str, Any]]):
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key, value in new.items():
+            child = f"{path}/{_escape(key)}"
+            if key not in old:
+                ops.append({"op": "add", "path": child, "value": value})
+            else:
+                _diff(old[key], value, child, ops)
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+
+    elif isinstance(old, list) and isinstance(new, list):
+        common = min(len(old), len(new))
+        for i in range(common):
+            _diff(old[i], new[i], f"{path}/{i}", ops)
+        for value in new[common:]:
+            ops.append({"op": "add", "path": f"{path}/-", "value": value})
+        # Remove from the end so earlier indexes stay valid
+        for i in range(len(old) - 1, common - 1, -1):
+            ops.append({"op": "remove", "path": f"{path}/{i}"})
+
+    elif type(old) is not type(new) or old != new:
+        ops.append({"op": "replace", "path": path, "value": new})
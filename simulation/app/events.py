@@ -0,0 +1,214 @@
+"""Discrete-event runner for headless simulations.
+
+The fixed-step loop (headless.run_headless, and main.py for the live
+dashboard) spends one full Factory.update per simulated second even when
+the plant is idle between orders. This runner ticks normally while anything
+is being produced, but whenever the factory is quiescent
+(Factory.is_quiescent) it jumps straight to the next scheduled event:
+
+    - worker arrivals / job completions (Worker.task_end_time)
+    - order due dates (penalties)
+    - the 7-day auto reset
+    - the next order arrival, sampled from the per-tick arrival probability
+
+Machine physics while RUNNING stays tick-driven (temperatures, speeds and
+failure rolls are re-drawn every tick), so busy stretches cost the same as
+the fixed-step loop; idle stretches cost a few heap operations per event.
+
+    python -m simulation.app.headless --engine event --days 7
+"""
+import heapq
+import itertools
+import math
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .factory import Factory
+from .orders import OrderBook
+from .clock import SimulatedClock
+from .config import UPDATE_INTERVAL
+
+# Slack for float drift when mapping event times onto the tick grid
+EPS = 1e-9
+
+
+class EventQueue:
+    """Min-heap of (time, rank, seq, kind, payload).
+
+    `rank` breaks exact time ties (0 before 1) and `seq` keeps the rest FIFO.
+    Entries are never removed in place; the runner drops stale ones when
+    they reach the top (lazy deletion).
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, int, str, Any]] = []
+        self._seq = itertools.count()
+
+    def push(self, time: float, kind: str, payload: Any = None, rank: int = 0):
+        heapq.heappush(self._heap, (time, rank, next(self._seq), kind, payload))
+
+    def peek(self) -> Optional[Tuple[float, int, str, Any]]:
+        if not self._heap:
+            return None
+        time, rank, _, kind, payload = self._heap[0]
+        return time, rank, kind, payload
+
+    def pop(self) -> Tuple[float, int, str, Any]:
+        time, rank, _, kind, payload = heapq.heappop(self._heap)
+        return time, rank, kind, payload
+
+    def clear(self):
+        self._heap.clear()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+
+# Event ranks: "fires when now >= t" sorts before "fires when now > t" at equal t
+AT_OR_AFTER = 0
+STRICTLY_AFTER = 1
+
+
+class DiscreteEventRunner:
+    """Hybrid next-event / fixed-step driver for a Factory on a SimulatedClock.
+
+    The queue persists across idle stretches: the earliest open due date
+    (from the OrderBook due heap) and worker timers are pushed whenever they
+    change, and entries that no longer apply (order shipped or fined,
+    worker re-dispatched, factory reset) are discarded when they surface.
+
+    `on_advance(factory, elapsed)` is called after every tick and after every
+    skip with the simulated seconds covered, so per-tick probes keep working
+    (machine statuses are constant during a skip).
+    """
+
+    def __init__(self, factory: Factory, dt: float = UPDATE_INTERVAL,
+                 on_advance: Optional[Callable[[Factory, float], None]] = None):
+        if not isinstance(factory.clock, SimulatedClock):
+            raise ValueError("DiscreteEventRunner requires a Factory driven by a SimulatedClock")
+        self.factory = factory
+        self.clock = factory.clock
+        self.dt = dt
+        self.on_advance = on_advance
+        self.queue = EventQueue()
+        self.stats = {"ticks": 0, "skips": 0, "skipped_seconds": 0.0, "orders_sampled": 0}
+
+        self._orders_ref: Optional[OrderBook] = None # factory.orders the queue was built from
+        self._next_due: Optional[float] = None
+        self._worker_timers: Dict[str, float] = {}
+        self._reset_at: Optional[float] = None
+
+    def run(self, duration: float) -> Factory:
+        steps_left = int(round(duration / self.dt))
+        while steps_left > 0:
+            if self.factory.is_quiescent():
+                gap = min(self._ticks_to_next_event(), steps_left)
+                if gap > 0:
+                    steps_left -= self._skip(gap)
+                    continue
+            self._tick()
+            steps_left -= 1
+        return self.factory
+
+    def _tick(self):
+        self.factory.update(self.dt)
+        self.clock.advance(self.dt)
+        self.stats["ticks"] += 1
+        if self.on_advance:
+            self.on_advance(self.factory, self.dt)
+
+    def _skip(self, gap: int) -> int:
+        """Jump `gap` idle ticks, stopping early on a sampled order arrival. Returns ticks covered."""
+        factory = self.factory
+        arrival = self._sample_order_arrival()
+        ticks = arrival if arrival is not None and arrival <= gap else gap
+        elapsed = ticks * self.dt
+
+        factory.skip_idle(elapsed)
+        if ticks == arrival:
+            # The order lands at the end of the arrival tick, like Factory._generate_new_orders
+            self.clock.advance(elapsed - self.dt)
+            factory._spawn_order()
+            self.clock.advance(self.dt)
+            self.stats["orders_sampled"] += 1
+        else:
+            self.clock.advance(elapsed)
+
+        self.stats["skips"] += 1
+        self.stats["skipped_seconds"] += elapsed
+        if self.on_advance:
+            self.on_advance(factory, elapsed)
+        return ticks
+
+    def _sample_order_arrival(self) -> Optional[int]:
+        """Ticks until the next order (1 = this tick): geometric with the per-tick arrival probability."""
+        p = self.factory._order_arrival_probability()
+        if p <= 0.0:
+            return None
+        if p >= 1.0:
+            return 1
+        u = self.factory.rng.random()
+        return int(math.log(1.0 - u) / math.log(1.0 - p)) + 1
+
+    def _sync(self):
+        """Push events for anything new since the last idle stretch."""
+        factory = self.factory
+        if factory.orders is not self._orders_ref or factory.sim_start_time != self._reset_at:
+            # First call, or the factory was reset: start over
+            self.queue.clear()
+            self._orders_ref = factory.orders
+            self._next_due = None
+            self._worker_timers.clear()
+            self._reset_at = factory.sim_start_time
+            self.queue.push(self._reset_at + 604800, "reset", self._reset_at, rank=STRICTLY_AFTER)
+
+        due = factory.orders.next_due()
+        if due is not None and due != self._next_due:
+            self._next_due = due
+            self.queue.push(due, "penalty", due, rank=STRICTLY_AFTER)
+
+        for w in factory.workers:
+            if w.state in ("MOVING", "WORKING") and self._worker_timers.get(w.id) != w.task_end_time:
+                self._worker_timers[w.id] = w.task_end_time
+                self.queue.push(w.task_end_time, "worker", w, rank=AT_OR_AFTER)
+
+    def _is_live(self, time: float, kind: str, payload: Any) -> bool:
+        if kind == "worker":
+            return payload.state in ("MOVING", "WORKING") and payload.task_end_time == time
+        if kind == "penalty":
+            return self.factory.orders.next_due() == time
+        return True # "reset": stale ones are cleared by _sync
+
+    def _ticks_to_next_event(self) -> int:
+        self._sync()
+        now = self.clock.now()
+        while True:
+            head = self.queue.peek()
+            if head is None:
+                return 0
+            time, rank, kind, payload = head
+            if self._is_live(time, kind, payload):
+                break
+            self.queue.pop()
+        return self._ticks_until(now, time, strict=(rank == STRICTLY_AFTER))
+
+    def _ticks_until(self, now: float, t: float, strict: bool) -> int:
+        """Ticks before the first one that observes `t` (now >= t, or now > t if strict)."""
+        if t < now or (not strict and t <= now + EPS):
+            return 0
+        k = (t - now) / self.dt
+        return math.floor(k + EPS) + 1 if strict else math.ceil(k - EPS)
+
+
+def run_event_driven(duration: float,
+                     dt: float = UPDATE_INTERVAL,
+                     factory: Optional[Factory] = None,
+                     start_time: float = 0.0,
+                     seed: Optional[int] = None,
+                     physics: str = "scalar",
+                     on_advance: Optional[Callable[[Factory, float], None]] = None) -> Factory:
+    """Event-driven counterpart of headless.run_headless (same arguments, minus snapshots)."""
+    if factory is None:
+        factory = Factory(clock=SimulatedClock(start_time), seed=seed, physics=physics)
+    runner = DiscreteEventRunner(factory, dt=dt, on_advance=on_advance)
+    runner.run(duration)
+    return factory
@@ -1,30 +1,56 @@
+import logging
 import time
 import random
 from typing import List, Dict, Any, Optional
 from .models import *
 from .config import *
+from .clock import WallClock
+from .kernel import VectorPhysics, HAS_NUMPY
+from .orders import OrderBook
+from .kpi import KPITracker, DOWN_STATUSES
+
+logger = logging.getLogger(__name__)
+_warned_no_numpy = False # Sweeps build many factories: say it once
 
 class ProductionLine:
-    def __init__(self, id: str, name: str, product_type: str = "Generic Unit"):
+    def __init__(self, id: str, name: str, product_type: str = "Generic Unit",
+                 config: Optional[SimConfig] = None, rng: Optional[random.Random] = None,
+                 kpi: Optional[KPITracker] = None):
         self.id = id
         self.name = name
         self.product_type = product_type
+        self.config = config or SimConfig()
+        self.rng = rng or random.Random()
+        self.kpi = kpi
         self.current_order: Optional[Dict[str, Any]] = None # Track active order
         self.machines: List[Machine] = []
         self._init_machines()
         
     def _init_machines(self):
         # Order matters for flow: Cutter -> Conveyor -> Robot -> Inspector -> Packer
-        self.machines.append(Cutter(id=f"{self.id}-CUT-01", name="Cutter", type="Cutter", line_id=self.id))
-        self.machines.append(Conveyor(id=f"{self.id}-CON-01", name="Conveyor", type="Conveyor", line_id=self.id))
-        self.machines.append(RobotArm(id=f"{self.id}-ROB-01", name="Robot Arm", type="RobotArm", line_id=self.id))
-        self.machines.append(Inspector(id=f"{self.id}-INS-01", name="Inspector", type="Inspector", line_id=self.id))
-        self.machines.append(Packer(id=f"{self.id}-PAC-01", name="Packer", type="Packer", line_id=self.id))
+        cfg, rng, kpi = self.config, self.rng, self.kpi
+        self.machines.append(Cutter(id=f"{self.id}-CUT-01", name="Cutter", type="Cutter", line_id=self.id, config=cfg, rng=rng, kpi=kpi))
+        self.machines.append(Conveyor(id=f"{self.id}-CON-01", name="Conveyor", type="Conveyor", line_id=self.id, config=cfg, rng=rng, kpi=kpi))
+        self.machines.append(RobotArm(id=f"{self.id}-ROB-01", name="Robot Arm", type="RobotArm", line_id=self.id, config=cfg, rng=rng, kpi=kpi))
+        self.machines.append(Inspector(id=f"{self.id}-INS-01", name="Inspector", type="Inspector", line_id=self.id, config=cfg, rng=rng, kpi=kpi))
+        self.machines.append(Packer(id=f"{self.id}-PAC-01", name="Packer", type="Packer", line_id=self.id, config=cfg, rng=rng, kpi=kpi))
 
     def get_machine(self, machine_id: str) -> Optional[Machine]:
         return next((m for m in self.machines if m.id == machine_id), None)
 
     def update(self, dt: float):
+        self.transfer_products()
+
+        # Update individual machines
+        for m in self.machines:
+            m.update(dt)
+
+    def advance_machines(self, dt: float):
+        """Product flow only; physics & failure rolls were already applied by VectorPhysics."""
+        for m in self.machines:
+            m.advance_process(dt)
+
+    def transfer_products(self):
         # Move Products between buffers (Flow Logic)
         for i in range(len(self.machines) - 1):
             curr_m = self.machines[i]
@@ -38,52 +64,80 @@ class ProductionLine:
                     # curr_m.status = "BLOCKED" (Optional: status update)
                     break 
                 
-                product = curr_m.output_buffer.pop(0)
+                product = curr_m.output_buffer.popleft()
                 next_m.input_buffer.append(product)
                 
                 # If we were starved/idle, wake up
                 if next_m.status in ["IDLE", "STARVED"]:
                     next_m.status = "RUNNING"
-                
-        # Update individual machines
-        for m in self.machines:
-            m.update(dt)
 
     def to_dict(self) -> Dict[str, Any]:
         return {
             "id": self.id,
             "name": self.name,
             "product_type": self.product_type,
-            "current_order": self.current_order,
+            "current_order": dict(self.current_order) if self.current_order else None, # Copy: snapshots must not alias live orders
             "machines": [m.to_dict() for m in self.machines]
         }
 
 class Factory:
-    def __init__(self):
-        self.lines: List[ProductionLine] = [
-            ProductionLine("L1", "Line A", "Smart Watch Pro"),
-            ProductionLine("L2", "Line B", "Smart Watch X1"),
-            ProductionLine("L3", "Line C", "Sensor Module")
-        ]
-        self.workers: List[Worker] = [
-            Worker(id=f"W-{i+1}", name=f"Worker {i+1}", location="HUB") 
-            for i in range(WORKER_COUNT)
-        ]
+    def __init__(self, clock=None, config: Optional[SimConfig] = None, seed: Optional[int] = None,
+                 physics: str = "scalar"):
+        # Time source: WallClock for the live loop, SimulatedClock for headless runs
+        self.clock = clock or WallClock()
+        # Per-instance settings (defaults come from config.py module constants)
+        self.config = config or SimConfig()
+        # Per-instance RNG shared by machines and workers: same seed -> identical run
+        self.seed = seed
+        self.rng = random.Random(seed)
+        # "scalar": per-machine update(); "vectorized": NumPy structure-of-arrays kernel
+        if physics == "vectorized" and not HAS_NUMPY:
+            global _warned_no_numpy
+            if not _warned_no_numpy:
+                _warned_no_numpy = True
+                logger.warning("NumPy not installed, falling back to scalar physics")
+            physics = "scalar"
+        self.physics = physics
+        self.kernel: Optional[VectorPhysics] = None
+        self.lines: List[ProductionLine] = self._init_lines()
+        self.workers: List[Worker] = self._init_workers()
         self.inventory: List[InventoryItem] = self._init_inventory()
         self.raw_material_source: int = 10000 # Infinite pool for simulation (Deprecated by auto-restock)
         self.finished_products: List[Product] = []
-        self.orders: List[Dict[str, Any]] = self._init_orders()
+        self.orders: OrderBook = OrderBook(self._init_orders())
         self.total_revenue: float = 0.0
         self.total_costs: float = 0.0
         self.total_energy_kwh: float = 0.0 # [NEW] Real Energy Tracking
-        self.cash_balance: float = INITIAL_CAPITAL
+        self.cash_balance: float = self.config.initial_capital
         self.asset_history: List[Dict[str, float]] = [] # Track daily/hourly assets
-        self.sim_start_time = time.time() # [NEW] Track runtime for 7-day reset
-        
+        self.sim_start_time = self.clock.now() # [NEW] Track runtime for 7-day reset
+        self.threshold_version = 0 # Bumped whenever the machines (and their randomized thresholds) are rebuilt
+        self._build_indexes()
+        
+    def _init_lines(self) -> List[ProductionLine]:
+        products = ["Smart Watch Pro", "Smart Watch X1", "Sensor Module"]
+        lines = []
+        # Fresh KPI accumulators with every set of lines (machines report into it)
+        self.kpi = KPITracker(start_time=self.clock.now())
+        for i in range(self.config.line_count):
+            name = f"Line {chr(ord('A') + i)}" if i < 26 else f"Line {i + 1}"
+            lines.append(ProductionLine(f"L{i+1}", name, products[i % len(products)], config=self.config, rng=self.rng, kpi=self.kpi))
+        self.kpi.ideal_rate = sum(1.0 / max(m.process_duration for m in line.machines) for line in lines)
+        if self.physics == "vectorized":
+            self.kernel = VectorPhysics(lines, seed=self.rng.getrandbits(64), config=self.config)
+        return lines
+
+    def _init_workers(self) -> List[Worker]:
+        return [
+            Worker(id=f"W-{i+1}", name=f"Worker {i+1}", location="HUB", config=self.config, rng=self.rng)
+            for i in range(self.config.worker_count)
+        ]
+
     def _init_inventory(self) -> List[InventoryItem]:
         items = []
+        now = self.clock.now()
         # 1. Raw Materials from DB
-        for key, data in MATERIALS_DB.items():
+        for key, data in self.config.materials_db.items():
             items.append(InventoryItem(
                 id=key, 
                 name=data["name"], 
@@ -92,57 +146,75 @@ class Factory:
                 unit="pcs",
                 safety_stock=data["safety_stock"],
                 reorder_point=data["safety_stock"],
-                cost_per_unit=data["cost"]
+                cost_per_unit=data["cost"],
+                last_updated=now
             ))
             
         # 2. Finished Goods (Placeholder for outputs)
-        items.append(InventoryItem(id="FIN-001", name="Finished Unit", category="Finished", quantity=0, cost_per_unit=50.0))
+        items.append(InventoryItem(id="FIN-001", name="Finished Unit", category="Finished", quantity=0, cost_per_unit=50.0, last_updated=now))
         return items
 
+    def _build_indexes(self):
+        """Lookup tables over lines & inventory. Rebuilt whenever those lists are replaced (init / reset)."""
+        # Machines in patrol order: L1 Cutter..Packer, L2 Cutter..Packer, ...
+        self.all_machines: List[Machine] = [m for line in self.lines for m in line.machines]
+        self.machine_index: Dict[str, Machine] = {m.id: m for m in self.all_machines}
+        self.machine_position: Dict[str, int] = {m.id: i for i, m in enumerate(self.all_machines)}
+        self.threshold_version += 1
+
+        self.inventory_by_id: Dict[str, InventoryItem] = {}
+        self.inventory_by_category: Dict[str, List[InventoryItem]] = {}
+        for item in self.inventory:
+            self.inventory_by_id.setdefault(item.id, item) # First match wins, like the old linear scan
+            self.inventory_by_category.setdefault(item.category, []).append(item)
+
+    def _first_in_category(self, category: str) -> Optional[InventoryItem]:
+        items = self.inventory_by_category.get(category)
+        return items[0] if items else None
+
     def get_machine(self, machine_id: str) -> Optional[Machine]:
-        for line in self.lines:
-            m = line.get_machine(machine_id)
-            if m: return m
-        return None
+        return self.machine_index.get(machine_id)
+
+    def threshold_profile(self) -> Dict[str, Any]:
+        """Every machine's randomized limits (what calculate_failure_risk uses), for the backend's detector."""
+        machines = {}
+        for m in self.all_machines:
+            machines[m.id] = {
+                "type": m.type,
+                "thresholds": {
+                    key: {"critical": m.thresholds[f"{key}_critical"], "safe": m.thresholds[f"{key}_safe"]}
+                    for key in self.config.base_thresholds.get(m.type, {})
+                },
+            }
+        return {"type": "thresholds", "version": self.threshold_version, "machines": machines}
 
     def reset(self):
         """Hard Factory Reset"""
-        self.cash_balance = INITIAL_CAPITAL
+        self.cash_balance = self.config.initial_capital
         self.total_costs = 0.0
         self.total_revenue = 0.0
         self.total_energy_kwh = 0.0
-        self.orders = []
+        self.orders = OrderBook()
         self.finished_products = []
         self.inventory = self._init_inventory()
         self.asset_history = []
-        self.sim_start_time = time.time() # [NEW] Reset timer
+        self.sim_start_time = self.clock.now() # [NEW] Reset timer
         
         # Reset Machines & Workers
-        self.workers = [
-            Worker(id=f"W-{i+1}", name=f"Worker {i+1}", location="HUB") 
-            for i in range(WORKER_COUNT)
-        ]
+        self.workers = self._init_workers()
         # Re-init Lines
-        self.lines = [
-            ProductionLine("L1", "Line A", "Smart Watch Pro"),
-            ProductionLine("L2", "Line B", "Smart Watch X1"),
-            ProductionLine("L3", "Line C", "Sensor Module")
-        ]
+        self.lines = self._init_lines()
+        self._build_indexes()
 
     def prune_orders(self):
         """Clean up old finished orders"""
-        now = time.time()
+        now = self.clock.now()
         # Remove Ready orders older than 24 hours (86400s)
-        self.orders = [
-            o for o in self.orders 
-            if not (o.get("status") == "Ready" and (now - o.get("completed_at", 0)) > 86400)
-        ]
+        self.orders.prune_ready(now, 86400)
 
     def _dispatch_orders(self):
         # Assign Pending/Assembly orders to available lines
         # "Assembly" here is treated as "In Production" for simplicity if not already assigned
-        active_orders = [o for o in self.orders if o["status"] in ["Pending", "Assembly", "Production"]]
-        
         for line in self.lines:
             # If line is free
             if line.current_order is None:
@@ -151,19 +223,15 @@ class Factory:
                 # Let's match product_type for realism as requested
                 
                 # [LOAD BALANCING] Allow ANY line to take ANY order
-                # Filter for orders that are NOT currently assigned to other lines
-                assigned_ids = [l.current_order["id"] for l in self.lines if l.current_order]
-                
-                # Pick highest priority / first available order
-                candidate = next((o for o in active_orders 
-                                  if o["id"] not in assigned_ids), None)
+                # Pick first available order not assigned to another line (OrderBook dispatch queue)
+                candidate = self.orders.take_next()
                 
                 if candidate:
                     line.current_order = candidate
                     # DYNAMIC RETOOLING: Line adapts to the product
                     line.product_type = candidate["product"] 
                     if candidate["status"] == "Pending":
-                        candidate["status"] = "Production"
+                        self.orders.set_status(candidate, "Production")
                     
                     # [FIX] Update display to show ACTUAL line (Load Balancing) - Always update when assigned
                     candidate["description"] = f"Production: {line.id}"
@@ -174,7 +242,12 @@ class Factory:
 
     def _generate_new_orders(self):
         # 2. Random New Orders (Dynamic Probability)
-        pending_count = len([o for o in self.orders if o["status"] != "Ready"])
+        if self.rng.random() < self._order_arrival_probability():
+             self._spawn_order()
+
+    def _order_arrival_probability(self) -> float:
+        """Per-tick chance of a new order (also used by events.py to sample idle gaps)."""
+        pending_count = self.orders.open_count()
         
         # Base probability 0.25%
         # User Logic: Decrease probability if pending orders > 6
@@ -184,51 +257,57 @@ class Factory:
         # If 12 pending: 0.0025 / 3 = 0.0008
         
         base_prob = 0.0025
-        adjusted_prob = base_prob / (1.0 + (pending_count / 6.0))
-        
-        if random.random() < adjusted_prob:
-             new_id = f"ORD-{int(time.time()*1000)}" # Unique ID
-             products = ["Smart Watch Pro", "Smart Watch X1", "Sensor Module"]
-             
-             # Random Due Date: 2 to 4 hours from now
-             due_seconds = random.randint(2 * 3600, 4 * 3600)
-             current_t = time.time()
-             
-             qty = random.randint(100, 1000)
-             
-             self.orders.append({
-                 "id": new_id,
-                 "customer": f"Client {random.randint(100, 999)}",
-                 "product": random.choice(products),
-                 "quantity": qty,
-                 "progress": 0,
-                 "status": "Pending",
-                 "created_at": current_t,
-                 "due": current_t + due_seconds,
-                 "fulfilled": 0,
-                 "penalty": float(qty * 5.0), # Penalty = $5 per unit
-                 "fined": False # Track if fine already applied
-             })
+        return base_prob / (1.0 + (pending_count / 6.0))
+
+    def _spawn_order(self):
+        current_t = self.clock.now()
+        new_id = f"ORD-{int(current_t*1000)}" # Unique ID
+        products = ["Smart Watch Pro", "Smart Watch X1", "Sensor Module"]
+        
+        # Random Due Date: 2 to 4 hours from now
+        due_seconds = self.rng.randint(2 * 3600, 4 * 3600)
+        
+        qty = self.rng.randint(100, 1000)
+        
+        self.orders.add({
+            "id": new_id,
+            "customer": f"Client {self.rng.randint(100, 999)}",
+            "product": self._choose_product(products),
+            "quantity": qty,
+            "progress": 0,
+            "status": "Pending",
+            "created_at": current_t,
+            "due": current_t + due_seconds,
+            "fulfilled": 0,
+            "penalty": float(qty * 5.0), # Penalty = $5 per unit
+            "fined": False # Track if fine already applied
+        })
+
+    def _choose_product(self, products: List[str]) -> str:
+        mix = self.config.order_mix
+        if not mix:
+            return self.rng.choice(products)
+        names = list(mix.keys())
+        return self.rng.choices(names, weights=[mix[n] for n in names])[0]
 
     def _check_penalties(self):
         """Apply fines for overdue orders"""
-        now = time.time()
-        for order in self.orders:
-            if order["status"] != "Ready" and not order.get("fined", False):
-                if now > order.get("due", float('inf')):
-                    # Overdue! Apply Fine
-                    # Fine = Penalty * (1 - Progress)
-                    # If 0% done, full fine. If 90% done, 10% fine.
-                    progress_ratio = order.get("progress", 0) / 100.0
-                    fine_amount = order.get("penalty", 500.0) * (1.0 - progress_ratio)
-                    
-                    self.cash_balance -= fine_amount
-                    self.total_costs += fine_amount
-                    order["fined"] = True
-                    # print(f"DEBUG: Order {order['id']} Overdue! Fined ${fine_amount:.2f}")
+        now = self.clock.now()
+        # Due-date heap: only orders that just went overdue (and are not Ready / already fined)
+        for order in self.orders.pop_overdue(now):
+            # Overdue! Apply Fine
+            # Fine = Penalty * (1 - Progress)
+            # If 0% done, full fine. If 90% done, 10% fine.
+            progress_ratio = order.get("progress", 0) / 100.0
+            fine_amount = order.get("penalty", 500.0) * (1.0 - progress_ratio)
+            
+            self.cash_balance -= fine_amount
+            self.total_costs += fine_amount
+            order["fined"] = True
+            # print(f"DEBUG: Order {order['id']} Overdue! Fined ${fine_amount:.2f}")
 
     def update(self, dt: float):
-        current_time = time.time()
+        current_time = self.clock.now()
         
         # [NEW] 7-Day Auto Reset
         # 7 days = 604800 seconds
@@ -237,6 +316,57 @@ class Factory:
             self.reset()
             return # Skip this tick
 
+        self._advance(dt, current_time)
+        
+        # 4. Economy & Orders
+        self._generate_new_orders()
+
+    def skip_idle(self, duration: float):
+        """Advance a quiescent factory by `duration` in one step (no order draw).
+
+        Only valid while is_quiescent() holds and no scheduled event falls
+        inside the interval; see events.DiscreteEventRunner.
+        """
+        self._advance(duration, self.clock.now())
+
+    def is_quiescent(self) -> bool:
+        """True if nothing changes state until the next scheduled event.
+
+        Every machine is parked (see Machine.is_parked) with no product able
+        to move, no line can be fed or handed a new order, and every worker
+        is mid-walk or mid-job. Typical case: lines stalled behind a broken
+        Cutter with full input buffers.
+        """
+        if any(w.state == "IDLE" for w in self.workers):
+            return False
+        claimed = {w.target_location for w in self.workers} | {w.location for w in self.workers if w.state == "WORKING"}
+
+        free_line = False
+        for line in self.lines:
+            order = line.current_order
+            if order is None:
+                free_line = True
+            elif order["status"] == "Ready" or order["progress"] >= 100:
+                return False # Dispatch frees the line next tick
+            elif len(line.machines[0].input_buffer) < 5:
+                return False # Cutter still being fed
+
+            for i, m in enumerate(line.machines):
+                if not m.is_parked():
+                    return False
+                if m.status == "WAITING_FOR_REPAIR" and m.id not in claimed:
+                    return False
+                if m.output_buffer:
+                    # Packer output is collected every tick; elsewhere it moves if there is room downstream
+                    if i == len(line.machines) - 1 or len(line.machines[i + 1].input_buffer) < line.machines[i + 1].capacity:
+                        return False
+
+        if free_line and self.orders.next_unassigned() is not None:
+            return False
+        return True
+
+    def _advance(self, dt: float, current_time: float):
+        self.kpi.now = current_time
         # 0. Eco-System: Dispatch Orders & Auto-Restock
         self._dispatch_orders()
         self._check_and_restock_inventory()
@@ -252,12 +382,13 @@ class Factory:
                 continue
 
             # Recipe Check
-            recipe = RECIPES.get(line.product_type, RECIPES["Generic Unit"])
+            recipes = self.config.recipes
+            recipe = recipes.get(line.product_type, recipes["Generic Unit"])
             can_produce = True
             
             # Verify Stocks
             for mat_id, qty_needed in recipe.items():
-                item = next((i for i in self.inventory if i.id == mat_id), None)
+                item = self.inventory_by_id.get(mat_id)
                 if not item or item.quantity < qty_needed:
                     can_produce = False
                     break
@@ -265,30 +396,40 @@ class Factory:
             if can_produce:
                 # Consume Materials
                 for mat_id, qty_needed in recipe.items():
-                    item = next((i for i in self.inventory if i.id == mat_id), None)
+                    item = self.inventory_by_id[mat_id]
                     item.quantity -= qty_needed
                 
                 # Spawn Product
-                p = Product(id=f"P-{int(time.time()*100)%10000}", type=line.product_type)
+                p = Product(id=f"P-{int(current_time*100)%10000}", type=line.product_type, created_at=current_time)
                 p.order_id = line.current_order["id"] 
                 cutter.input_buffer.append(p)
 
         # 2. Update Lines (Machine logic)
+        if self.kernel:
+            # Vectorized engine: move products, then physics & failure rolls for every machine at once
+            for line in self.lines:
+                line.transfer_products()
+            self.kernel.step(dt)
+
         for line in self.lines:
-            line.update(dt)
+            if self.kernel:
+                line.advance_machines(dt)
+            else:
+                line.update(dt)
             
             # Collect Finished Products from Packers
             packer = line.machines[-1]
             while packer.output_buffer:
-                prod = packer.output_buffer.pop(0)
+                prod = packer.output_buffer.popleft()
                 self.finished_products.append(prod)
+                self.kpi.record_packed(current_time - prod.created_at)
                 
                 # Update Finished Goods Inventory (Generic)
-                fin_item = next((i for i in self.inventory if i.category == "Finished"), None)
+                fin_item = self._first_in_category("Finished")
                 if fin_item: fin_item.quantity += 1
                 
                 # Consume Packaging
-                pkg_item = next((i for i in self.inventory if i.id == "PACKAGING"), None)
+                pkg_item = self.inventory_by_id.get("PACKAGING")
                 if pkg_item and pkg_item.quantity > 0:
                      pkg_item.quantity -= 1
                 
@@ -298,15 +439,16 @@ class Factory:
                 
         # 3. Worker Logic (Dispatch & Patrol)
         self._update_workers(dt, current_time)
-        
-        # 4. Economy & Orders
-        self._generate_new_orders()
+
+        # Availability for windowed OEE
+        down = sum(1 for m in self.all_machines if m.status in DOWN_STATUSES)
+        self.kpi.record_machine_time(dt, len(self.all_machines), down)
 
     def _check_and_restock_inventory(self):
         for item in self.inventory:
             if item.category == "Raw Material" and item.quantity <= item.reorder_point:
                 # Auto-Purchase
-                data = MATERIALS_DB.get(item.id)
+                data = self.config.materials_db.get(item.id)
                 amount = data["restock_amount"] if data else 500
                 cost = amount * item.cost_per_unit
                 
@@ -329,18 +471,18 @@ class Factory:
         order["progress"] = min(100, int((fulfilled / order["quantity"]) * 100))
         
         # Track Production Revenue (Accrual)
-        self.total_revenue += PRODUCT_PRICE
+        self.total_revenue += self.config.product_price
         
         if order["progress"] >= 100:
-            order["status"] = "Ready"
-            if "completed_at" not in order: order["completed_at"] = time.time()
+            self.orders.set_status(order, "Ready")
+            if "completed_at" not in order: order["completed_at"] = self.clock.now()
             # Cash Settlement (Payment received)
-            order_value = order["quantity"] * PRODUCT_PRICE
+            order_value = order["quantity"] * self.config.product_price
             self.cash_balance += order_value
             
             # Reduce Inv (Shipment)
             # Find generic finished item
-            fin = next((i for i in self.inventory if i.category == "Finished"), None)
+            fin = self._first_in_category("Finished")
             if fin:
                 fin.quantity = max(0, fin.quantity - order["quantity"])
 
@@ -392,106 +534,36 @@ class Factory:
 
     def _update_workers(self, dt: float, current_time: float):
         # Update Operational Costs (Wages)
-        wages = (WORKER_HOURLY_WAGE / 3600.0) * dt * len(self.workers)
+        wages = (self.config.worker_hourly_wage / 3600.0) * dt * len(self.workers)
         self.total_costs += wages
         self.cash_balance -= wages
         
         # Power & Energy Costs
         # [FIX] Real Energy Calculation
         energy_this_tick = 0.0
-        for line in self.lines:
-            for m in line.machines:
-                 if m.status == "RUNNING":
-                     # Base load + Speed load
-                     # Assumed: Machine uses ~0.5kW idle/support, + 1kW per 1000 speed/efficiency units roughly
-                     # Simplified: 2.0 kW per machine running avg
-                     power_kw = 2.0 
-                     
-                     # Detailed per type override
-                     if m.type == "Cutter": power_kw = 3.0 + (m.metrics.get("speed", 1000)/1000.0)
-                     elif m.type == "Conveyor": power_kw = 0.5 + m.metrics.get("speed", 1.0)
-                     
-                     energy_kwh = power_kw * (dt / 3600.0) # kW * hours
-                     energy_this_tick += energy_kwh
+        if self.kernel:
+            energy_this_tick = self.kernel.running_power_kw() * (dt / 3600.0)
+        else:
+            for line in self.lines:
+                for m in line.machines:
+                     if m.status == "RUNNING":
+                         # Base load + Speed load, per type (see Machine.power_kw)
+                         energy_kwh = m.power_kw() * (dt / 3600.0) # kW * hours
+                         energy_this_tick += energy_kwh
         
         self.total_energy_kwh += energy_this_tick
-        self.total_costs += (energy_this_tick * ENERGY_COST_PER_KWH)
-        self.cash_balance -= (energy_this_tick * ENERGY_COST_PER_KWH)
-
-        # Identify broken machines
-        broken_machines = []
-        high_wear_machines = []
-        for line in self.lines:
-            for m in line.machines:
-                if m.status in ["ERROR", "WAITING_FOR_REPAIR"]:
-                    broken_machines.append(m)
-                elif m.status != "REPAIRING":
-                    # Check for high wear
-                    for p in m.parts:
-                        if p.wear > 0.8:
-                            high_wear_machines.append(m)
-                            break
+        self.total_costs += (energy_this_tick * self.config.energy_cost_per_kwh)
+        self.cash_balance -= (energy_this_tick * self.config.energy_cost_per_kwh)
 
-        # [FIX] Enhanced Dispatch Logic (Interrupt Patrols)
-        
-        # 1. Identify Urgent Tasks
-        urgent_repairs = [m for m in broken_machines if m.status == "WAITING_FOR_REPAIR"]
-        
-        # 2. Map current targets to avoid double booking
-        claimed_targets = set()
-        for w in self.workers:
-            if w.target_location:
-                claimed_targets.add(w.target_location)
-        
-        # 3. Assign IDLE workers first
         # [FIX] Refactored Logic: Update -> Repair -> Dispatch
         
         # 1. Update Movement & Timers
         for worker in self.workers:
             worker.update(dt, current_time)
 
-        # 2. Check for Arrivals & Start Repairs
-        # ... (rest of logic implied, handled in other view, we are just bridging the gap to control_machine) ... 
-        # Wait, I cannot skip lines if I am replacing a block.
-        # I need to be careful. The target block starts at 172 and ends at 448? That's too huge.
-        # I should make separate edits.
-        # Edit 1: Remove duplicate _generate_new_orders.
-        # Edit 2: Update control_machine.
-        pass
-
         # Update Operational Costs (Wages)
-        self.total_costs += (WORKER_HOURLY_WAGE / 3600.0) * dt * len(self.workers)
-        
-
-
-        # Identify broken machines
-        broken_machines = []
-        high_wear_machines = []
-        for line in self.lines:
-            for m in line.machines:
-                if m.status in ["ERROR", "WAITING_FOR_REPAIR"]:
-                    broken_machines.append(m)
-                elif m.status != "REPAIRING":
-                    # Check for high wear
-                    for p in m.parts:
-                        if p.wear > 0.8:
-                            high_wear_machines.append(m)
-                            break
+        self.total_costs += (self.config.worker_hourly_wage / 3600.0) * dt * len(self.workers)
 
-        # [FIX] Enhanced Dispatch Logic (Interrupt Patrols)
-        
-        # 1. Identify Urgent Tasks
-        urgent_repairs = [m for m in broken_machines if m.status == "WAITING_FOR_REPAIR"]
-        
-        # 2. Map current targets to avoid double booking
-        claimed_targets = set()
-        for w in self.workers:
-            if w.target_location:
-                claimed_targets.add(w.target_location)
-        
-        # 3. Assign IDLE workers first
-        # [FIX] Refactored Logic: Update -> Repair -> Dispatch
-        
         # 1. Update Movement & Timers
         for worker in self.workers:
             worker.update(dt, current_time)
@@ -506,9 +578,9 @@ class Factory:
                     
                     if machine.status == "WAITING_FOR_REPAIR":
                         # Reactive Repair
-                        worker.start_job(REPAIR_TIME_BASE, current_time)
+                        worker.start_job(self.config.repair_time_base, current_time)
                         machine.status = "REPAIRING"
-                        self.total_costs += REPAIR_COST
+                        self.total_costs += self.config.repair_cost
                         started_work = True
                         
                     elif machine.status != "REPAIRING":
@@ -521,9 +593,9 @@ class Factory:
                         
                         if needs_preventive:
                             # Preventive Service
-                            worker.start_job(REPAIR_TIME_BASE * 0.5, current_time)
+                            worker.start_job(self.config.repair_time_base * 0.5, current_time)
                             machine.status = "REPAIRING"
-                            self.total_costs += REPAIR_COST * 0.5
+                            self.total_costs += self.config.repair_cost * 0.5
                             started_work = True
 
                     elif machine.status == "REPAIRING":
@@ -562,18 +634,8 @@ class Factory:
 
         # 3. Dispatch & Redirect Logic
         
-        # Identify urgent tasks again (status might have changed due to step 2)
-        broken_machines = []
-        high_wear_machines = []
-        for line in self.lines:
-            for m in line.machines:
-                if m.status in ["ERROR", "WAITING_FOR_REPAIR"]:
-                    broken_machines.append(m)
-                elif m.status != "REPAIRING":
-                    for p in m.parts:
-                        if p.wear > 0.8:
-                            high_wear_machines.append(m)
-                            break
+        # Identify urgent tasks (status might have changed due to step 2)
+        broken_machines, high_wear_machines = self._scan_machines()
 
         urgent_repairs = [m for m in broken_machines if m.status == "WAITING_FOR_REPAIR"]
         
@@ -622,19 +684,30 @@ class Factory:
                         self._dispatch_worker(worker, new_target, current_time)
                         claimed_targets.add(new_target.id)
 
+    def _scan_machines(self):
+        """Returns (broken_machines, high_wear_machines) in line order for worker dispatch."""
+        if self.kernel:
+            return self.kernel.scan_for_maintenance(0.8)
+
+        broken_machines = []
+        high_wear_machines = []
+        for line in self.lines:
+            for m in line.machines:
+                if m.status in ["ERROR", "WAITING_FOR_REPAIR"]:
+                    broken_machines.append(m)
+                elif m.status != "REPAIRING":
+                    # Check for high wear
+                    for p in m.parts:
+                        if p.wear > 0.8:
+                            high_wear_machines.append(m)
+                            break
+        return broken_machines, high_wear_machines
+
     def _patrol_worker(self, worker: Worker, current_time: float):
         # Sequential Logic: Find current index in topology and move to next
         # Topology: Hub -> L1M1 -> L1M2 ... -> L1M5 -> L2M1 ...
-        all_machines = []
-        for line in self.lines:
-            all_machines.extend(line.machines)
-            
-        current_idx = -1
-        if worker.location and worker.location != "HUB":
-            for i, m in enumerate(all_machines):
-                if m.id == worker.location:
-                    current_idx = i
-                    break
+        all_machines = self.all_machines
+        current_idx = self.machine_position.get(worker.location, -1) # HUB / unknown -> -1
         
         # Move to next (Loop around)
         next_idx = (current_idx + 1) % len(all_machines)
@@ -651,8 +724,8 @@ class Factory:
         # Calculate Time: Sum of Gaussian noise per hop
         total_time = 0
         for _ in range(max(1, hops)): # At least 1 hop
-             noise = max(0, random.gauss(TRAVEL_NOISE_MEAN, TRAVEL_NOISE_STD))
-             total_time += (WORKER_SPEED_BASE + noise)
+             noise = max(0, self.rng.gauss(self.config.travel_noise_mean, self.config.travel_noise_std))
+             total_time += (self.config.worker_speed_base + noise)
              
         worker.state = "MOVING"
         worker.target_location = target_machine.id
@@ -662,8 +735,8 @@ class Factory:
          # Generic move helper
          total_time = 0
          for _ in range(max(1, hops)): 
-             noise = max(0, random.gauss(TRAVEL_NOISE_MEAN, TRAVEL_NOISE_STD))
-             total_time += (WORKER_SPEED_BASE + noise)
+             noise = max(0, self.rng.gauss(self.config.travel_noise_mean, self.config.travel_noise_std))
+             total_time += (self.config.worker_speed_base + noise)
          worker.state = "MOVING"
          worker.target_location = target_id
          worker.task_end_time = current_time + total_time
@@ -671,7 +744,7 @@ class Factory:
     def _calculate_hops(self, start_loc: str, end_loc: str) -> int:
         if start_loc == end_loc: return 0
         # Simplified: Random 1-3 for neighboring, 3-6 for far
-        return random.randint(1, 4)
+        return self.rng.randint(1, 4)
 
     def control_machine(self, machine_id: str, command: str):
         # [NEW] Handle System Commands
@@ -748,24 +821,17 @@ class Factory:
         return False
 
     def to_dict(self) -> Dict[str, Any]:
-        # Aggregate KPIs on the fly
-        total_output = 0
-        total_defects = 0
+        # Output / defects / cycle time come from the running KPI accumulators (kpi.py)
+        self.kpi.now = self.clock.now()
+        total_output = self.kpi.total_output
+        total_defects = self.kpi.total_defects
         total_energy = 0.0 
         machine_count = 0
-        total_cycle_time = 0.0
         total_efficiency = 0.0
         
         for line in self.lines:
             for m in line.machines:
                 machine_count += 1
-                # Output comes from Packers
-                if m.type == "Packer":
-                    total_output += m.metrics.get("packed_count", 0)
-                
-                # Defects come from Inspectors
-                if m.type == "Inspector":
-                     total_defects += m.metrics.get("fail_count", 0)
                 
                 # Efficiency Accumulation
                 # Use speed ratio for Cutter/Conveyor as proxy for efficiency?
@@ -787,9 +853,9 @@ class Factory:
         if total_energy == 0:
              total_energy = self.total_energy_kwh
 
-        avg_cycle_time = 4.2 # Mock baseline
-        if total_output > 0:
-             avg_cycle_time = 4.0 + (random.random() * 0.5)
+        # Real feed-to-pack time over the last 15 minutes (was a random placeholder)
+        windows = self.kpi.to_dict()
+        avg_cycle_time = windows["15m"]["avg_cycle_time"]
 
         defect_rate = 0.0
         if total_output + total_defects > 0:
@@ -803,7 +869,7 @@ class Factory:
             "lines": [l.to_dict() for l in self.lines],
             "inventory": [i.to_dict() for i in self.inventory],
             "workers": [w.to_dict() for w in self.workers],
-            "orders": self.orders,
+            "orders": [dict(o) for o in self.orders], # Copies, so consecutive snapshots can be diffed
             "financials": {
                 "revenue": round(self.total_revenue, 2),
                 "costs": round(self.total_costs, 2),
@@ -816,7 +882,8 @@ class Factory:
                 "avg_cycle_time": round(avg_cycle_time, 2),
                 "energy_usage": int(total_energy),
                 "defect_rate": round(defect_rate, 2),
-                "avg_efficiency": round(avg_efficiency, 1)
+                "avg_efficiency": round(avg_efficiency, 1),
+                "windows": windows # Rolling 1m / 15m / 1h OEE breakdown
             },
-            "pending_orders_count": len([o for o in self.orders if o["status"] == "Pending" or o["status"] == "Production"])
+            "pending_orders_count": self.orders.count("Pending", "Production")
         }
@@ -0,0 +1,110 @@
+"""Headless fast-forward runner.
+
+Drives a Factory on a SimulatedClock with no websocket server, so days of
+factory time complete in seconds. Used for capacity planning and regression
+studies on config.py parameters.
+
+    python -m simulation.app.headless --days 7 --out week.json
+
+`--engine event` skips idle stretches with the discrete-event runner
+(events.py) instead of ticking through them.
+"""
+import argparse
+import json
+import time
+from typing import Callable, Optional, Dict, Any
+
+from .factory import Factory
+from .clock import SimulatedClock
+from .config import SimConfig, UPDATE_INTERVAL
+from .events import DiscreteEventRunner
+
+
+def run_headless(duration: float,
+                 dt: float = UPDATE_INTERVAL,
+                 factory: Optional[Factory] = None,
+                 start_time: float = 0.0,
+                 seed: Optional[int] = None,
+                 physics: str = "scalar",
+                 snapshot_every: Optional[float] = None,
+                 on_snapshot: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 on_tick: Optional[Callable[[Factory, float], None]] = None) -> Factory:
+    """Advance a factory by `duration` simulated seconds in steps of `dt`.
+
+    If `factory` is given it must have been built with a SimulatedClock
+    (and `start_time` / `seed` / `physics` are ignored).
+    `on_snapshot` receives `factory.to_dict()` every `snapshot_every`
+    simulated seconds (plus a "timestamp" key, like the live broadcast).
+    `on_tick(factory, dt)` is called after every tick and is cheap enough
+    for per-tick KPI probes.
+    """
+    if factory is None:
+        factory = Factory(clock=SimulatedClock(start_time), seed=seed, physics=physics)
+    clock = factory.clock
+    if not isinstance(clock, SimulatedClock):
+        raise ValueError("run_headless requires a Factory driven by a SimulatedClock")
+
+    steps = int(round(duration / dt))
+    snapshot_steps = max(1, int(round(snapshot_every / dt))) if snapshot_every else 0
+
+    for step in range(1, steps + 1):
+        factory.update(dt)
+        clock.advance(dt)
+
+        if on_tick:
+            on_tick(factory, dt)
+
+        if on_snapshot and snapshot_steps and step % snapshot_steps == 0:
+            data = factory.to_dict()
+            data["timestamp"] = clock.now()
+            on_snapshot(data)
+
+    return factory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the factory simulation headless on a simulated clock.")
+    parser.add_argument("--days", type=float, default=0.0, help="Simulated days to run")
+    parser.add_argument("--hours", type=float, default=0.0, help="Simulated hours to run (added to --days)")
+    parser.add_argument("--dt", type=float, default=UPDATE_INTERVAL, help="Simulated seconds per tick")
+    parser.add_argument("--start", type=float, default=0.0, help="Simulated epoch start time")
+    parser.add_argument("--seed", type=int, default=None, help="RNG seed (same seed -> identical run)")
+    parser.add_argument("--physics", choices=["scalar", "vectorized"], default="scalar",
+                        help="Machine physics engine (vectorized requires numpy)")
+    parser.add_argument("--engine", choices=["fixed", "event"], default="fixed",
+                        help="fixed: tick every dt; event: jump over idle stretches")
+    parser.add_argument("--lines", type=int, default=None, help="Number of production lines (default: config)")
+    parser.add_argument("--out", type=str, default=None, help="Write the final factory state as JSON to this file")
+    args = parser.parse_args()
+
+    duration = args.days * 86400 + args.hours * 3600
+    if duration <= 0:
+        duration = 3600.0  # Default: one simulated hour
+
+    config = SimConfig(line_count=args.lines) if args.lines else SimConfig()
+    factory = Factory(clock=SimulatedClock(args.start), config=config, seed=args.seed, physics=args.physics)
+
+    wall_start = time.time()
+    if args.engine == "event":
+        runner = DiscreteEventRunner(factory, dt=args.dt)
+        runner.run(duration)
+        print(f"Event engine: {runner.stats['ticks']} ticks, {runner.stats['skips']} skips "
+              f"({runner.stats['skipped_seconds']:.0f}s skipped)")
+    else:
+        run_headless(duration, dt=args.dt, factory=factory)
+    wall_elapsed = time.time() - wall_start
+
+    data = factory.to_dict()
+    data["timestamp"] = factory.clock.now()
+
+    print(f"Simulated {duration:.0f}s in {wall_elapsed:.2f}s wall time "
+          f"({duration / max(wall_elapsed, 1e-9):.0f}x real time)")
+    print(json.dumps({"financials": data["financials"], "kpi": data["kpi"]}, indent=2))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+from collections import deque
+from typing import Dict, Any, List
+
+# Machine statuses counted as unavailable for OEE
+DOWN_STATUSES = ("ERROR", "WAITING_FOR_REPAIR", "REPAIRING")
+
+# Counter slots shared by the lifetime totals and every rolling window
+PACKED, PASSED, FAILED, CYCLE_TIME, MACHINE_SECONDS, DOWN_SECONDS = range(6)
+N_FIELDS = 6
+
+# name -> (span seconds, bucket seconds)
+WINDOWS = {
+    "1m": (60.0, 1.0),
+    "15m": (900.0, 15.0),
+    "1h": (3600.0, 60.0),
+}
+
+
+def oee(packed: float, passed: float, failed: float, machine_seconds: float, down_seconds: float,
+        elapsed: float, ideal_rate: float) -> Dict[str, float]:
+    """OEE = availability * performance * quality.
+
+    availability: share of machine time not broken or under repair
+    performance:  packed output against the nominal line rate while available
+    quality:      inspector pass ratio
+    """
+    availability = 1.0 - down_seconds / machine_seconds if machine_seconds else 1.0
+    available_time = elapsed * availability
+    performance = min(1.0, packed / (ideal_rate * available_time)) if available_time > 0 and ideal_rate > 0 else 0.0
+    quality = passed / (passed + failed) if (passed + failed) > 0 else 1.0
+    return {
+        "availability": availability,
+        "performance": performance,
+        "quality": quality,
+        "oee": availability * performance * quality,
+    }
+
+
+class RollingWindow:
+    """Counter sums over the last `span` seconds, kept in `bucket`-second slots.
+
+    Adding and reading are amortized O(1): expired slots are subtracted from
+    the running totals as they fall out of the window.
+    """
+
+    def __init__(self, span: float, bucket: float):
+        self.span = span
+        self.bucket = bucket
+        self.slots: deque = deque() # [bucket_start, counters]
+        self.totals: List[float] = [0.0] * N_FIELDS
+
+    def _expire(self, now: float):
+        horizon = now - self.span
+        while self.slots and self.slots[0][0] + self.bucket <= horizon:
+            _, counters = self.slots.popleft()
+            for i, v in enumerate(counters):
+                self.totals[i] -= v
+
+    def add(self, now: float, field: int, amount: float):
+        start = now - (now % self.bucket)
+        if not self.slots or self.slots[-1][0] != start:
+            self.slots.append([start, [0.0] * N_FIELDS])
+            self._expire(now)
+        self.slots[-1][1][field] += amount
+        self.totals[field] += amount
+
+    def read(self, now: float) -> List[float]:
+        self._expire(now)
+        return self.totals
+
+
+class KPITracker:
+    """Running production KPIs, updated as events happen.
+
+    Packers / inspectors report through record_packed / record_inspection,
+    Factory reports machine time once per tick. Reads never walk machines.
+    """
+
+    def __init__(self, start_time: float, ideal_rate: float = 0.0):
+        self.ideal_rate = ideal_rate # Products per second across all lines at nominal speed
+        self.start_time = start_time
+        self.now = start_time
+        self.totals: List[float] = [0.0] * N_FIELDS
+        self.windows: Dict[str, RollingWindow] = {
+            name: RollingWindow(span, bucket) for name, (span, bucket) in WINDOWS.items()
+        }
+
+    def _add(self, field: int, amount: float):
+        self.totals[field] += amount
+        for w in self.windows.values():
+            w.add(self.now, field, amount)
+
+    def record_packed(self, cycle_time: float):
+        self._add(PACKED, 1)
+        self._add(CYCLE_TIME, cycle_time)
+
+    def record_inspection(self, passed: bool):
+        self._add(PASSED if passed else FAILED, 1)
+
+    def record_machine_time(self, dt: float, machines: int, down: int):
+        self._add(MACHINE_SECONDS, dt * machines)
+        self._add(DOWN_SECONDS, dt * down)
+
+    @property
+    def total_output(self) -> int:
+        return int(self.totals[PACKED])
+
+    @property
+    def total_defects(self) -> int:
+        return int(self.totals[FAILED])
+
+    @property
+    def total_passed(self) -> int:
+        return int(self.totals[PASSED])
+
+    @property
+    def down_seconds(self) -> float:
+        return self.totals[DOWN_SECONDS]
+
+    @property
+    def machine_seconds(self) -> float:
+        return self.totals[MACHINE_SECONDS]
+
+    def _summary(self, counters: List[float], elapsed: float) -> Dict[str, Any]:
+        packed = counters[PACKED]
+        result = oee(packed, counters[PASSED], counters[FAILED],
+                     counters[MACHINE_SECONDS], counters[DOWN_SECONDS], elapsed, self.ideal_rate)
+        result = {k: round(v, 4) for k, v in result.items()}
+        result["output"] = int(packed)
+        result["defects"] = int(counters[FAILED])
+        # Mean seconds from feeding the cutter to leaving the packer
+        result["avg_cycle_time"] = round(counters[CYCLE_TIME] / packed, 2) if packed else 0.0
+        return result
+
+    def window(self, name: str) -> Dict[str, Any]:
+        w = self.windows[name]
+        elapsed = min(w.span, self.now - self.start_time)
+        return self._summary(w.read(self.now), elapsed)
+
+    def lifetime(self) -> Dict[str, Any]:
+        return self._summary(self.totals, self.now - self.start_time)
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {name: self.window(name) for name in self.windows}
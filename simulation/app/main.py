@@ -5,9 +5,25 @@ import time
 import logging
 import os
 from contextlib import asynccontextmanager
+from typing import Dict, Any
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from .factory import Factory
 from .config import UPDATE_INTERVAL
+from .delta import make_patch
+from . import wire
+from .fanout import Outbox
+
+# Optional fast JSON encoder (same output format as json.dumps)
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+def dumps(data) -> str:
+    if HAS_ORJSON:
+        return orjson.dumps(data).decode("utf-8")
+    return json.dumps(data)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -15,19 +31,73 @@ logger = logging.getLogger(__name__)
 
 # Global Factory Instance
 global_factory = None
-connected_clients = set()
+# websocket -> stream state. "full": raw snapshot JSON every tick (default, legacy clients).
+# "delta": {"type": "snapshot"} once, then {"type": "delta", "seq", "ops"} (see delta.py)
+# "encoding": "json" (text frames, default) or "msgpack" (binary frames, see wire.py)
+# "outbox": bounded latest-wins send queue with its own sender task (see fanout.py)
+connected_clients: Dict[WebSocket, Dict[str, Any]] = {}
+state_seq = 0 # Incremented once per broadcast tick
+last_state = None # Previous tick's snapshot, base for the next delta
+published_thresholds = None # Factory.threshold_version last pushed to every client
+OUTBOX_SIZE = int(os.environ.get("SIM_CLIENT_QUEUE", 2)) # Frames buffered per client before old ones are dropped
+
+def drop_client(outbox: Outbox):
+    """Evict a client whose send failed or stalled."""
+    websocket = outbox.websocket
+    if connected_clients.pop(websocket, None) is not None:
+        logger.info(f"Evicted dead client. Total clients: {len(connected_clients)}")
+    asyncio.create_task(close_quietly(websocket))
+
+async def close_quietly(websocket: WebSocket):
+    try:
+        await websocket.close()
+    except Exception:
+        pass
+
+def send_thresholds(outbox: Outbox):
+    """Per-machine limits (see Factory.threshold_profile). Always JSON text, like the hello."""
+    if global_factory:
+        outbox.put_control(dumps(global_factory.threshold_profile()))
 
 async def broadcast(data):
+    global state_seq, last_state
+    state_seq += 1
+    previous, last_state = last_state, data
     if not connected_clients:
         return
-    message = json.dumps(data)
-    # Create a list of tasks to send messages to all clients
-    tasks = [asyncio.create_task(client.send_text(message)) for client in connected_clients]
-    # Wait for all tasks to complete, ignoring errors
-    await asyncio.gather(*tasks, return_exceptions=True)
+
+    # Each message kind is built and encoded at most once per tick, however many clients want it
+    messages: Dict[str, Any] = {}
+    encoded: Dict[tuple, Any] = {}
+    def message_for(kind: str, encoding: str):
+        if kind not in messages:
+            if kind == "full":
+                messages[kind] = data
+            elif kind == "snapshot":
+                messages[kind] = {"type": "snapshot", "seq": state_seq, "data": data}
+            else:
+                messages[kind] = {"type": "delta", "seq": state_seq, "ops": make_patch(previous, data)}
+        key = (kind, encoding)
+        if key not in encoded:
+            encoded[key] = wire.pack(messages[kind]) if encoding == "msgpack" else dumps(messages[kind])
+        return encoded[key]
+
+    # Hand frames to each client's outbox; their sender tasks run concurrently and
+    # never block this loop. Failed / stalled sockets are evicted by drop_client.
+    for stream in list(connected_clients.values()):
+        outbox = stream["outbox"]
+        if stream["mode"] != "delta":
+            outbox.put(message_for("full", stream["encoding"]))
+            continue
+        # A delta client that is behind would lose a frame from its chain: replace its backlog with a snapshot
+        if stream["needs_snapshot"] or previous is None or outbox.full():
+            stream["needs_snapshot"] = False
+            outbox.put(message_for("snapshot", stream["encoding"]), replace=True)
+        else:
+            outbox.put(message_for("delta", stream["encoding"]))
 
 async def run_simulation():
-    global global_factory
+    global global_factory, published_thresholds
     global_factory = Factory()
     factory = global_factory
     logger.info("Simulation Engine Started")
@@ -37,10 +107,16 @@ async def run_simulation():
         
         # Update factory state
         factory.update(UPDATE_INTERVAL)
+
+        # Machines rebuilt (7-day reset): everyone gets the new thresholds before the next state
+        if factory.threshold_version != published_thresholds:
+            published_thresholds = factory.threshold_version
+            for stream in list(connected_clients.values()):
+                send_thresholds(stream["outbox"])
         
         # Prepare data
         data = factory.to_dict()
-        data["timestamp"] = time.time()
+        data["timestamp"] = factory.clock.now()
         
         # Broadcast data
         await broadcast(data)
@@ -73,13 +149,21 @@ async def health_check():
 @app.websocket("/")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
-    connected_clients.add(websocket)
+    outbox = Outbox(websocket, maxsize=OUTBOX_SIZE, on_dead=drop_client)
+    connected_clients[websocket] = {"mode": "full", "encoding": "json", "needs_snapshot": True, "outbox": outbox}
     logger.info(f"Client connected. Total clients: {len(connected_clients)}")
+    send_thresholds(outbox) # Handshake: thresholds first, ahead of any state frame
     try:
         while True:
-            message = await websocket.receive_text()
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
             try:
-                data = json.loads(message)
+                # Commands arrive as JSON text, or as msgpack binary once a client has negotiated it
+                if message.get("bytes") is not None:
+                    data = wire.msgpack.unpackb(message["bytes"], raw=False)
+                else:
+                    data = json.loads(message["text"])
                 if data.get("action") == "control":
                     machine_id = data.get("machine_id")
                     command = data.get("command")
@@ -87,15 +171,45 @@ async def websocket_endpoint(websocket: WebSocket):
                     
                     if global_factory:
                         global_factory.control_machine(machine_id, command)
+
+                elif data.get("action") == "subscribe":
+                    # Protocol negotiation: {"action": "subscribe", "mode": "delta" | "full", "encoding": "json" | "msgpack"}
+                    mode = data.get("mode", "full")
+                    encoding = data.get("encoding", "json")
+                    if encoding == "msgpack" and not wire.HAS_MSGPACK:
+                        logger.warning("Client asked for msgpack but it is not installed, staying on JSON")
+                        encoding = "json"
+                    if encoding == "msgpack":
+                        # Key table first, so the client can read binary frames (JSON, since it has no table yet).
+                        # Control lane: goes out ahead of any state frame and can't be dropped by the next snapshot
+                        outbox.put_control(dumps(wire.hello()))
+                    else:
+                        encoding = "json"
+                    connected_clients[websocket] = {
+                        "mode": mode if mode in ("full", "delta") else "full",
+                        "encoding": encoding,
+                        "needs_snapshot": True,
+                        "outbox": outbox,
+                    }
+                    logger.info(f"Client subscribed with mode: {connected_clients[websocket]['mode']}, encoding: {encoding}")
+
+                elif data.get("action") == "get_thresholds":
+                    send_thresholds(outbox)
+
+                elif data.get("action") == "resync":
+                    # Client missed a delta (sequence gap): full snapshot on the next tick
+                    if websocket in connected_clients:
+                        connected_clients[websocket]["needs_snapshot"] = True
             except Exception as e:
                 logger.error(f"Error processing message: {e}")
     except WebSocketDisconnect:
-        connected_clients.remove(websocket)
+        connected_clients.pop(websocket, None)
         logger.info(f"Client disconnected. Total clients: {len(connected_clients)}")
     except Exception as e:
         logger.error(f"WebSocket Connection Error: {e}")
-        if websocket in connected_clients:
-            connected_clients.remove(websocket)
+        connected_clients.pop(websocket, None)
+    finally:
+        outbox.close()
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,9 +1,11 @@
 import random
 import time
 import math
+from collections import deque
 from dataclasses import dataclass, field
-from typing import Dict, Any, Optional, List, Tuple
+from typing import Dict, Any, Optional, List, Tuple, ClassVar, FrozenSet, Deque
 from .config import *
+from .kpi import KPITracker
 
 @dataclass
 class Part:
@@ -27,9 +29,9 @@ class Product:
     created_at: float = field(default_factory=time.time)
     history: List[str] = field(default_factory=list)
 
-    def move_to(self, stage: str):
+    def move_to(self, stage: str, now: float):
         self.stage = stage
-        self.history.append(f"{time.time()}:{stage}")
+        self.history.append(f"{now}:{stage}")
 
 @dataclass
 class Worker:
@@ -42,6 +44,8 @@ class Worker:
     
     # Navigation state
     path: List[str] = field(default_factory=list) # List of machine IDs to visit
+    config: SimConfig = field(default_factory=SimConfig, repr=False, compare=False)
+    rng: random.Random = field(default_factory=random.Random, repr=False, compare=False) # Owning Factory's RNG
     
     def update(self, dt: float, current_time: float):
         if self.state == "MOVING":
@@ -68,8 +72,8 @@ class Worker:
         self.target_location = target_id
         
         # Calculate travel time: Base + Gaussian Noise
-        noise = max(0, random.gauss(TRAVEL_NOISE_MEAN, TRAVEL_NOISE_STD))
-        travel_time = WORKER_SPEED_BASE + noise
+        noise = max(0, self.rng.gauss(self.config.travel_noise_mean, self.config.travel_noise_std))
+        travel_time = self.config.worker_speed_base + noise
         
         self.task_end_time = current_time + travel_time
 
@@ -109,22 +113,31 @@ class Machine:
     
     # Buffers
     # Buffers
-    input_buffer: List[Product] = field(default_factory=list)
-    output_buffer: List[Product] = field(default_factory=list)
+    # FIFO queues: products enter at the right, leave with popleft() (O(1))
+    input_buffer: Deque[Product] = field(default_factory=deque)
+    output_buffer: Deque[Product] = field(default_factory=deque)
     capacity: int = 5 # [NEW] Max input buffer size
     processing_product: Optional[Product] = None
     process_timer: float = 0.0
     process_duration: float = 2.0 # Seconds to process one item
+    # Statuses in which a tick rolls calculate_failure_risk (see update)
+    failure_statuses: ClassVar[FrozenSet[str]] = frozenset({"RUNNING"})
+    # Statuses advance_process leaves for RUNNING once input arrives
+    wake_statuses: ClassVar[FrozenSet[str]] = frozenset({"IDLE", "STARVED"})
+    config: SimConfig = field(default_factory=SimConfig, repr=False, compare=False)
+    rng: random.Random = field(default_factory=random.Random, repr=False, compare=False) # Owning Factory's RNG
+    kpi: Optional[KPITracker] = field(default=None, repr=False, compare=False) # Owning Factory's KPI accumulators
     
     def __post_init__(self):
         self._init_thresholds()
         
     def _init_thresholds(self):
         # Apply randomization to base thresholds
-        base = base_thresholds.get(self.type, {})
+        base = self.config.base_thresholds.get(self.type, {})
+        variance = self.config.threshold_variance
         for key, limits in base.items():
             # Randomize +/- 10%
-            factor = random.uniform(1.0 - THRESHOLD_VARIANCE, 1.0 + THRESHOLD_VARIANCE)
+            factor = self.rng.uniform(1.0 - variance, 1.0 + variance)
             self.thresholds[f"{key}_critical"] = limits["critical"] * factor
             self.thresholds[f"{key}_safe"] = limits.get("safe_max", limits["critical"] * 0.8) * factor
 
@@ -149,7 +162,7 @@ class Machine:
                         primary_cause = f"{metric} ({value:.1f} > {crit:.1f})"
                 
                 if ratio > 1.0: ratio = 1.0
-                risk_accumulated += (ratio ** FAILURE_EXPONENT)
+                risk_accumulated += (ratio ** self.config.failure_exponent)
                 
         # Final probability check
         # NEW: Check Parts
@@ -157,8 +170,8 @@ class Machine:
             if part.wear >= 1.0:
                 return True, f"{part.name} Failure (Wear 100%)"
         
-        prob = FAILURE_CHANCE_BASE * (1 + risk_accumulated * 100)
-        if random.random() < prob:
+        prob = self.config.failure_chance_base * (1 + risk_accumulated * 100)
+        if self.rng.random() < prob:
             print(f"DEBUG: {self.id} FAILED! Reason: {primary_cause}. Prob: {prob:.6f}. RiskAcc: {risk_accumulated:.4f}")
             return True, primary_cause
         return False, "None"
@@ -183,7 +196,41 @@ class Machine:
         # Clear buffers logic can remain as is (maybe keep products to avoid loss)
 
     def update(self, dt: float):
-        pass # Override by subclasses
+        """One tick: physics for the current status, failure check, then product flow."""
+        self.update_physics(dt)
+        if self.check_failure():
+            return
+        self.advance_process(dt)
+
+    def is_parked(self) -> bool:
+        """True if the next tick only applies closed-form physics (cool-down / spin-down) here.
+
+        Not RUNNING, no failure roll in this status, and nothing waiting that
+        advance_process would start on. Used by Factory.is_quiescent.
+        """
+        if self.status == "RUNNING" or self.status in self.failure_statuses:
+            return False
+        return not (self.input_buffer and self.status in self.wake_statuses)
+
+    def check_failure(self) -> bool:
+        """Rolls calculate_failure_risk if the current status allows it. Switches to ERROR on failure."""
+        if self.status not in self.failure_statuses:
+            return False
+        failed, reason = self.calculate_failure_risk()
+        if failed:
+            self.status = "ERROR"
+            self.last_fault_reason = reason
+        return failed
+
+    def update_physics(self, dt: float):
+        pass # Override by subclasses: metrics & part wear
+
+    def power_kw(self) -> float:
+        """Electrical draw: ~2 kW average while RUNNING (Cutter / Conveyor scale with speed), 0 otherwise."""
+        return 2.0 if self.status == "RUNNING" else 0.0
+
+    def advance_process(self, dt: float):
+        pass # Override by subclasses: processing timer, buffers & status transitions
 
     def to_dict(self) -> Dict[str, Any]:
         # [FIX] Dynamic Health Score based on Parts
@@ -197,11 +244,12 @@ class Machine:
             "status": self.status,
             "last_fault": self.last_fault_reason,
             "health_score": round(self.health_score, 1),
-            "metrics": self.metrics,
+            "metrics": dict(self.metrics),
             "input_count": len(self.input_buffer),
             "input_count": len(self.input_buffer),
             "output_count": len(self.output_buffer),
-            "wear_level": max_wear
+            "wear_level": max_wear,
+            "power": round(self.power_kw(), 3), # kW, same model as the factory's energy bill
         }
         # Flatten metrics for easier frontend consumption
         base.update(self.metrics)
@@ -210,25 +258,31 @@ class Machine:
 
 @dataclass
 class Cutter(Machine):
+    # Fed directly by Factory (no transfer_products wake-up), so only IDLE restarts on input
+    wake_statuses: ClassVar[FrozenSet[str]] = frozenset({"IDLE"})
+
     def __post_init__(self):
         super().__post_init__()
         self.parts = [Part(name="Blade", wear_rate=0.00075)]
 
-    def update(self, dt: float):
+    def power_kw(self) -> float:
+        return 3.0 + self.metrics.get("speed", 1000) / 1000.0 if self.status == "RUNNING" else 0.0
+
+    def update_physics(self, dt: float):
         if self.status == "RUNNING":
             # Simulate Physics
             # Speed Control: Use setting or default 3000
-            target_speed = self.metrics.get("speed_setting", 1500.0)
+            target_speed = self.metrics.get("speed_setting", self.config.cutter_speed_setting)
             
             # Actual Speed = Target + Noise
-            self.metrics["speed"] = target_speed + random.randint(-50, 50)
+            self.metrics["speed"] = target_speed + self.rng.randint(-50, 50)
             
             # Temperature Rise is proportional to Speed^2 (Physics!)
             # Base rise at 3000rpm = ~1.5 degrees/sec
             heat_factor = (self.metrics["speed"] / 1500.0) ** 2
             
             temp = self.metrics.get("temperature", 25.0)
-            heating = (random.uniform(0.8, 1.8) * heat_factor) * dt
+            heating = (self.rng.uniform(0.8, 1.8) * heat_factor) * dt
             
             # [FIX] Newton's Law of Cooling: Rate is proportional to difference from ambient (25.0)
             # Cooling coefficient needs to be enough to cool down when speed is low
@@ -237,20 +291,30 @@ class Cutter(Machine):
             self.metrics["temperature"] = max(25.0, temp + heating - cooling)
             
             # Additional Mock Metrics
-            self.metrics["vibration"] = random.uniform(0.1, 2.5) + (temp / 100.0) * (self.metrics["speed"] / 1500.0)
+            self.metrics["vibration"] = self.rng.uniform(0.1, 2.5) + (temp / 100.0) * (self.metrics["speed"] / 1500.0)
             self.metrics["tool_wear"] = self.metrics.get("tool_wear", 0.0) + (0.001 * dt * heat_factor)
             
             # Update Parts
             for p in self.parts:
                 p.wear += p.wear_rate * (self.metrics["speed"] / 1500.0) * dt
-            
-            # Check Failure
-            failed, reason = self.calculate_failure_risk()
-            if failed:
-                self.status = "ERROR"
-                self.last_fault_reason = reason
-                return
+        
+        elif self.status == "IDLE":
+             # Cooling down
+             temp = self.metrics.get("temperature", 25.0)
+             self.metrics["temperature"] = max(25.0, temp - 1.0 * dt)
+             self.metrics["speed"] = max(0.0, self.metrics.get("speed", 0.0) - 500 * dt) # Decelerate
+                 
+        elif self.status == "ERROR":
+             # Physics continue even in error (Spin down)
+             current_speed = self.metrics.get("speed", 0.0)
+             self.metrics["speed"] = max(0.0, current_speed - 200 * dt) # Friction stops it
+             
+             # Cool down slowly
+             temp = self.metrics.get("temperature", 25.0)
+             self.metrics["temperature"] = max(25.0, temp - 0.5 * dt)
 
+    def advance_process(self, dt: float):
+        if self.status == "RUNNING":
             # Processing Logic
             if self.processing_product:
                 # [FIX] Production Speed is proportional to RPM
@@ -264,41 +328,32 @@ class Cutter(Machine):
                     self.processing_product = None
             elif self.input_buffer:
                 # Start new
-                self.processing_product = self.input_buffer.pop(0)
+                self.processing_product = self.input_buffer.popleft()
                 self.process_timer = self.process_duration
             else:
                 self.status = "STARVED"
-        
+
         elif self.status == "IDLE":
-             # Cooling down
-             temp = self.metrics.get("temperature", 25.0)
-             self.metrics["temperature"] = max(25.0, temp - 1.0 * dt)
-             self.metrics["speed"] = max(0.0, self.metrics.get("speed", 0.0) - 500 * dt) # Decelerate
-             
              if self.input_buffer:
                  self.status = "RUNNING"
-                 
-        elif self.status == "ERROR":
-             # Physics continue even in error (Spin down)
-             current_speed = self.metrics.get("speed", 0.0)
-             self.metrics["speed"] = max(0.0, current_speed - 200 * dt) # Friction stops it
-             
-             # Cool down slowly
-             temp = self.metrics.get("temperature", 25.0)
-             self.metrics["temperature"] = max(25.0, temp - 0.5 * dt)
 
 
 @dataclass
 class Conveyor(Machine):
     process_duration: float = 5.0
     capacity: int = 10 # [NEW] Larger buffer for conveyor
+    # Only stopped-but-not-broken states roll for failure (ERROR / repair states are excluded by calculate_failure_risk)
+    failure_statuses: ClassVar[FrozenSet[str]] = frozenset({"BLOCKED", "MAINTENANCE"})
     
     def __post_init__(self):
         super().__post_init__()
         # [FIX] Significantly reduced wear rates (10x slower) to prevent rapid breakdown
         self.parts = [Part(name="Belt", wear_rate=0.0001), Part(name="Motor", wear_rate=0.00005)]
+
+    def power_kw(self) -> float:
+        return 0.5 + self.metrics.get("speed", 1.0) if self.status == "RUNNING" else 0.0
     
-    def update(self, dt: float):
+    def update_physics(self, dt: float):
         if self.status == "RUNNING":
              metrics = self.metrics
              # Real load = items on belt (input buffer) + item being processed
@@ -309,7 +364,7 @@ class Conveyor(Machine):
              # Base Speed from AI setting (default 1.2)
              base_speed = self.metrics.get("target_speed", 0.8)
              
-             jitter = random.uniform(-0.02, 0.02)
+             jitter = self.rng.uniform(-0.02, 0.02)
              # Apply load friction
              self.speed = max(0.5, base_speed - (current_load * 0.05) + jitter)
              self.metrics["speed"] = self.speed
@@ -320,7 +375,15 @@ class Conveyor(Machine):
              for p in self.parts:
                  # [FIX] Clamp wear at 1.0 (100%)
                  p.wear = min(1.0, p.wear + p.wear_rate * dt * load_factor)
-             
+        
+        else:
+            # [FIX] Ensure speed is 0 for any other state (IDLE, STARVED, ERROR, FAULT, etc.)
+            # No wear when not running
+            self.speed = 0.0
+            self.metrics["speed"] = 0.0
+
+    def advance_process(self, dt: float):
+        if self.status == "RUNNING":
              if self.processing_product:
                 # [FIX] Throughput proportional to speed (Base 1.2 m/s)
                 speed_factor = max(0.1, self.metrics["speed"] / 0.8)
@@ -331,30 +394,14 @@ class Conveyor(Machine):
                     self.output_buffer.append(self.processing_product)
                     self.processing_product = None
              elif self.input_buffer:
-                self.processing_product = self.input_buffer.pop(0)
+                self.processing_product = self.input_buffer.popleft()
                 self.process_timer = self.process_duration
              else:
                 self.status = "STARVED"
         
         elif self.status in ["IDLE", "STARVED"]:
-            self.speed = 0.0
-            self.metrics["speed"] = 0.0
             if self.input_buffer:
                 self.status = "RUNNING"
-        
-        else:
-            # [FIX] Ensure speed is 0 for any other state (ERROR, FAULT, etc.)
-            self.speed = 0.0
-            self.metrics["speed"] = 0.0
-            
-            # Reduce wear significantly when idle
-            for p in self.parts:
-                 p.wear += 0.0 # No wear when idle
-                 
-            failed, reason = self.calculate_failure_risk()
-            if failed:
-                self.status = "ERROR"
-                self.last_fault_reason = reason
 
 @dataclass
 class RobotArm(Machine):
@@ -363,27 +410,23 @@ class RobotArm(Machine):
     def __post_init__(self):
         super().__post_init__()
         self.parts = [Part(name="Servos", wear_rate=0.0001), Part(name="Gripper", wear_rate=0.0003)]
-    def update(self, dt: float):
+
+    def update_physics(self, dt: float):
         if self.status == "RUNNING":
-            load = self.metrics.get("load", 0.0)
             if self.processing_product:
                 self.metrics["load"] = 8.0 # High load when working
-                self.metrics["current"] = 12.5 + random.uniform(-0.5, 0.5)
+                self.metrics["current"] = 12.5 + self.rng.uniform(-0.5, 0.5)
                 
                 for p in self.parts:
                     p.wear += p.wear_rate * 1.5 * dt # High wear under load
             else:
                 self.metrics["load"] = 2.0
-                self.metrics["current"] = 2.0 + random.uniform(-0.1, 0.1)
+                self.metrics["current"] = 2.0 + self.rng.uniform(-0.1, 0.1)
                 
             self.metrics["cycles"] = self.metrics.get("cycles", 0) # Increment on finish
-                
-            failed, reason = self.calculate_failure_risk()
-            if failed:
-                self.status = "ERROR"
-                self.last_fault_reason = reason
-                return
 
+    def advance_process(self, dt: float):
+        if self.status == "RUNNING":
             if self.processing_product:
                 # [FIX] Throughput proportional to efficiency (100% base)
                 eff = self.metrics.get("efficiency", 80.0)
@@ -394,10 +437,10 @@ class RobotArm(Machine):
                     self.processing_product = None
                     self.metrics["cycles"] = self.metrics.get("cycles", 0) + 1
             elif self.input_buffer:
-                self.processing_product = self.input_buffer.pop(0)
+                self.processing_product = self.input_buffer.popleft()
                 self.process_timer = self.process_duration
                 # Default efficiency fluctuates slightly
-                self.metrics["efficiency"] = 100.0 + random.randint(-5, 5)
+                self.metrics["efficiency"] = 100.0 + self.rng.randint(-5, 5)
             else:
                 self.status = "STARVED"
 
@@ -408,17 +451,20 @@ class RobotArm(Machine):
 @dataclass
 class Inspector(Machine):
     process_duration: float = 2.0
+    failure_statuses: ClassVar[FrozenSet[str]] = frozenset() # Inspectors never break down randomly
     
     def __post_init__(self):
         super().__post_init__()
         self.parts = [Part(name="Camera", wear_rate=0.0001), Part(name="Light", wear_rate=0.0005)]
     
-    def update(self, dt: float):
+    def update_physics(self, dt: float):
         if self.status == "RUNNING":
              # Camera wears only when running
              for p in self.parts:
                  p.wear += p.wear_rate * dt
-             
+
+    def advance_process(self, dt: float):
+        if self.status == "RUNNING":
              if self.processing_product:
                 # [FIX] Throughput proportional to efficiency/speed
                 eff = self.metrics.get("speed", 100.0) # Using 'speed' metric 
@@ -426,11 +472,13 @@ class Inspector(Machine):
 
                 if self.process_timer <= 0:
                     # Random defect check
-                    if random.random() < 0.05:
+                    if self.rng.random() < 0.05:
                         self.processing_product.quality = 0.0 # Defect
                         self.metrics["fail_count"] = self.metrics.get("fail_count", 0) + 1
+                        if self.kpi: self.kpi.record_inspection(passed=False)
                     else:
                         self.metrics["pass_count"] = self.metrics.get("pass_count", 0) + 1
+                        if self.kpi: self.kpi.record_inspection(passed=True)
                     
                     # Update Rate
                     total = self.metrics.get("pass_count", 0) + self.metrics.get("fail_count", 0)
@@ -440,7 +488,7 @@ class Inspector(Machine):
                     self.output_buffer.append(self.processing_product)
                     self.processing_product = None
              elif self.input_buffer:
-                self.processing_product = self.input_buffer.pop(0)
+                self.processing_product = self.input_buffer.popleft()
                 self.process_timer = self.process_duration
              else:
                 self.status = "STARVED"
@@ -456,17 +504,14 @@ class Packer(Machine):
     def __post_init__(self):
         super().__post_init__()
         self.parts = [Part(name="Pneumatics", wear_rate=0.0005)]
-    def update(self, dt: float):
+
+    def update_physics(self, dt: float):
         if self.status == "RUNNING":
             for p in self.parts:
                 p.wear += p.wear_rate * dt
 
-            failed, reason = self.calculate_failure_risk()
-            if failed:
-                self.status = "ERROR"
-                self.last_fault_reason = reason
-                return
-                
+    def advance_process(self, dt: float):
+        if self.status == "RUNNING":
             if self.processing_product:
                 # [FIX] Throughput proportional to efficiency
                 eff = self.metrics.get("efficiency", 100.0)
@@ -479,7 +524,7 @@ class Packer(Machine):
                     self.metrics["packed_count"] = self.metrics.get("packed_count", 0) + 1
                     self.metrics["jam_rate"] = 0.0 # Mock jam rate
             elif self.input_buffer:
-                self.processing_product = self.input_buffer.pop(0)
+                self.processing_product = self.input_buffer.popleft()
                 self.process_timer = self.process_duration
             else:
                 self.status = "STARVED"
@@ -0,0 +1,125 @@
+import heapq
+import itertools
+from typing import Dict, Any, Optional, List, Set, Tuple, Iterable, Iterator
+
+# Statuses a line can pick up (see Factory._dispatch_orders)
+ACTIVE_STATUSES = ("Pending", "Assembly", "Production")
+
+
+class OrderBook:
+    """Orders as the same plain dicts the frontend receives, plus indexes.
+
+    - per-status id sets, so counts don't scan the whole book
+    - a due-date heap, so penalty checks only look at orders that just went overdue
+    - a dispatch queue (arrival order) holding active orders no line has taken yet
+
+    Status changes must go through set_status() to keep the sets right.
+    Heap entries are not removed in place; stale ones are dropped when they
+    reach the top.
+    """
+
+    def __init__(self, orders: Optional[Iterable[Dict[str, Any]]] = None):
+        self._orders: Dict[str, Dict[str, Any]] = {} # id -> order, in arrival order
+        self._by_status: Dict[str, Set[str]] = {}
+        self._due_heap: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._dispatch_heap: List[Tuple[int, Dict[str, Any]]] = []
+        self._seq = itertools.count()
+        for order in orders or []:
+            self.add(order)
+
+    def add(self, order: Dict[str, Any]):
+        seq = next(self._seq)
+        self._orders[order["id"]] = order
+        self._by_status.setdefault(order["status"], set()).add(order["id"])
+
+        due = order.get("due")
+        # Starter orders carry display-only date strings, never fined
+        if isinstance(due, (int, float)):
+            heapq.heappush(self._due_heap, (due, seq, order))
+        if order["status"] in ACTIVE_STATUSES:
+            heapq.heappush(self._dispatch_heap, (seq, order))
+
+    def get(self, order_id: str) -> Optional[Dict[str, Any]]:
+        return self._orders.get(order_id)
+
+    def set_status(self, order: Dict[str, Any], status: str):
+        old = order["status"]
+        if old == status:
+            return
+        self._by_status.get(old, set()).discard(order["id"])
+        self._by_status.setdefault(status, set()).add(order["id"])
+        order["status"] = status
+
+    def count(self, *statuses: str) -> int:
+        return sum(len(self._by_status.get(s, ())) for s in statuses)
+
+    def open_count(self) -> int:
+        """Orders not yet Ready."""
+        return len(self._orders) - self.count("Ready")
+
+    def _live(self, order: Dict[str, Any]) -> bool:
+        # Pruned (or replaced under the same id) orders are stale heap entries
+        return self._orders.get(order["id"]) is order
+
+    # --- Dispatch ---
+
+    def next_unassigned(self) -> Optional[Dict[str, Any]]:
+        """Oldest active order not yet handed to a line (None if there is none)."""
+        heap = self._dispatch_heap
+        while heap:
+            order = heap[0][1]
+            if self._live(order) and order["status"] in ACTIVE_STATUSES:
+                return order
+            heapq.heappop(heap)
+        return None
+
+    def take_next(self) -> Optional[Dict[str, Any]]:
+        """Remove and return next_unassigned(); the caller assigns it to a line."""
+        order = self.next_unassigned()
+        if order is not None:
+            heapq.heappop(self._dispatch_heap)
+        return order
+
+    # --- Due dates ---
+
+    def _is_finable(self, order: Dict[str, Any]) -> bool:
+        return self._live(order) and order["status"] != "Ready" and not order.get("fined", False)
+
+    def next_due(self) -> Optional[float]:
+        """Earliest due date among orders that can still be fined."""
+        heap = self._due_heap
+        while heap:
+            due, _, order = heap[0]
+            if self._is_finable(order):
+                return due
+            heapq.heappop(heap)
+        return None
+
+    def pop_overdue(self, now: float) -> List[Dict[str, Any]]:
+        """Finable orders with due < now, earliest first. Each is returned once."""
+        overdue = []
+        heap = self._due_heap
+        while heap and heap[0][0] < now:
+            _, _, order = heapq.heappop(heap)
+            if self._is_finable(order):
+                overdue.append(order)
+        return overdue
+
+    # --- Housekeeping ---
+
+    def prune_ready(self, now: float, max_age: float):
+        """Drop Ready orders completed more than max_age seconds ago."""
+        ready = self._by_status.get("Ready", set())
+        stale = [oid for oid in ready if (now - self._orders[oid].get("completed_at", 0)) > max_age]
+        for oid in stale:
+            ready.discard(oid)
+            del self._orders[oid]
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        return list(self._orders.values())
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self._orders.values())
+
+    def __len__(self) -> int:
+        return len(self._orders)
@@ -0,0 +1,59 @@
+"""Binary (MessagePack) wire format for the simulation stream.
+
+Map keys found in KEYS are sent as their small-int index instead of the
+string ("temperature" -> 1 byte instead of 12). The table is handed to the
+client once, in the JSON "hello" that answers a msgpack subscribe, so the
+client never needs its own copy. Keys not in the table go out as plain
+strings, and snapshot keys are always strings, so int keys are unambiguous.
+"""
+from typing import Any, Dict
+
+try:
+    import msgpack
+    HAS_MSGPACK = True
+except ImportError:
+    HAS_MSGPACK = False
+
+# Append only: clients get the table in the hello, but keep existing indexes stable anyway
+KEYS = (
+    # Stream envelope / delta ops
+    "type", "seq", "data", "ops", "op", "path", "value",
+    # Machines
+    "id", "name", "status", "metrics", "temperature", "vibration", "speed", "load",
+    "wear", "wear_level", "health_score", "last_fault", "input_count", "output_count",
+    "tool_wear", "load_count", "current", "cycles", "efficiency", "pass_count",
+    "fail_count", "pass_rate", "packed_count", "jam_rate", "parts", "quantity",
+    # Lines / workers / orders
+    "lines", "machines", "product_type", "current_order", "workers", "location",
+    "state", "target", "orders", "customer", "product", "progress", "due",
+    "fulfilled", "description",
+    # Inventory
+    "inventory", "category", "unit", "safety_stock", "reorder_point", "trend",
+    "cost_per_unit", "total_value", "last_updated",
+    # Financials / KPIs
+    "financials", "revenue", "costs", "profit", "cash", "assets", "kpi",
+    "total_output", "energy_usage", "defect_rate", "avg_efficiency",
+    "avg_cycle_time", "windows", "availability", "performance", "quality", "oee",
+    "output", "defects", "pending_orders_count", "timestamp",
+    # Added later
+    "power",
+)
+KEY_INDEX: Dict[str, int] = {key: i for i, key in enumerate(KEYS)}
+
+
+def _intern(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return {KEY_INDEX.get(k, k): _intern(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_intern(v) for v in obj]
+    return obj
+
+
+def pack(data: Any) -> bytes:
+    """Encode one stream message as a msgpack binary frame with interned keys."""
+    return msgpack.packb(_intern(data), use_bin_type=True)
+
+
+def hello() -> Dict[str, Any]:
+    """Sent (as JSON text) when a client switches to msgpack."""
+    return {"type": "hello", "encoding": "msgpack", "keys": list(KEYS)}